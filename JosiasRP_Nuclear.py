@@ -10,37 +10,49 @@ a map, the distribution of explosions across countries, and creating allowing th
 custom charts and tables based on their selected criteria.
 """
 
+import hashlib
+import os
+from importlib import metadata
+from pathlib import Path
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import folium
-from streamlit_folium import st_folium
-import tempfile
-import seaborn as sns
-
-
-# Main DataFrame for data
-df_nuke = pd.read_csv('nuclear_explosions.csv')
-df_nuke.drop_duplicates(inplace=True)
-
-# Making column names easier to type + useable with certain functions [DA1 + drop dupes above]
-df_nuke = df_nuke.rename(columns={
-                                    'WEAPON_SOURCE': 'country',
-                                    'LOCATION': 'location',
-                                    'Data.Source': 'data_source',
-                                    'latitude': 'latitude',
-                                    'longitude': 'longitude',
-                                    'Data.Magnitude.Body': 'magnitude_body',
-                                    'Data.Magnitude.Surface': 'magnitude_surface',
-                                    'Location.Cordinates.Depth': 'depth',
-                                    'Data.Yeild.Lower': 'yield_lower',
-                                    'Data.Yeild.Upper': 'yield_upper',
-                                    'Data.Purpose': 'purpose',
-                                    'Data.Name': 'name',
-                                    'Data.Type': 'type',
-                                    'Date.Day': 'day',
-                                    'Date.Month': 'month',
-                                    'Date.Year': 'year'})
+from nuke_timing import IMPORT_TIMES, RerunTimer
+
+
+# Timings of each section of this rerun, shown in a sidebar panel when the app is opened with ?debug=1 (or NUKES_DEBUG=1)
+# and appended as JSON lines to NUKES_TIMING_LOG when that is set. With neither, timer.section() is a no-op.
+debug_panel = st.query_params.get('debug') == '1' or os.environ.get('NUKES_DEBUG') == '1'
+timer = RerunTimer(enabled=debug_panel, log_path=os.environ.get('NUKES_TIMING_LOG'))
+
+# Only what every page needs is imported up front. Folium (maps) is imported by the first map that isn't in the map
+# cache, through timer.import_module, so a session that opens on the Introduction page never loads it;
+# matplotlib/seaborn (charts) are only imported by the render pool's worker processes; xlsxwriter and pyarrow are
+# imported by nuke_export when an export is generated
+with timer.section('import/core'):
+    import nuke_analytics as analytics
+    import pandas as pd
+    from nuke_cache import DiskLRUCache, LRUCache
+    from nuke_catalog import Catalog
+    from nuke_data import DATA_PATH
+    from nuke_export import EXPORT_FORMATS, export_table
+    from nuke_downsample import downsample
+    from nuke_memory import format_bytes, session_memory, snapshot_memory
+    from nuke_query import Page, Query
+    from nuke_render import RENDER_TIMEOUT, RenderPool, RenderTimeout
+    from nuke_spatial import CELL_LEVELS, PointIndex, aggregate_cells, rows_in_cell
+
+
+# Main DataFrame for data, parsed and cleaned once and shared read-only by every session [DA1 + drop dupes in
+# nuke_catalog]. Pages gather the rows and columns they need by position rather than keeping their own copies. Rows
+# appended to the CSV or dropped into the incoming folder are picked up on the next rerun without a full reload.
+@st.cache_resource(show_spinner="Loading explosion data...")
+def get_catalog(path, incoming_dir):
+    return Catalog(path, incoming_dir=incoming_dir, k=5)
+
+with timer.section('load'):
+    catalog = get_catalog(DATA_PATH, os.environ.get('NUKES_INCOMING_DIR', DATA_PATH.with_name('incoming')))
+    snapshot = catalog.refresh()
+data_version = snapshot.version
 
 # Dictionary of user-friendly column names for later use
 column_usf = {
@@ -59,108 +71,247 @@ column_usf = {
                 'type': 'Type',
                 'day': 'Day',
                 'month': 'Month',
-                'year': 'Year'}
-
-
-# Goes through a field/column and finds all unique values for that field and counts its frequency
-def find_unique_values(data, field):  # [PY3] [DA1 / DA4, function for filtering/manipulating data]
-    unique_values = {}
-    unique_list = [val for val in data[field].unique()]  # [PY4]
-    unique_values = data[field].value_counts().to_dict()
-    return unique_list, unique_values  # [PY2]
-
-# Runs the function for all columns
-unique_data = {}
-
-for col in df_nuke.columns:
-    unique_list, unique_values = find_unique_values(df_nuke, col)
-    unique_data[col] = (unique_list, unique_values)
+                'year': 'Year',
+                'date': 'Date',
+                'magnitude_body_missing': 'Magnitude (Body) Missing',
+                'magnitude_surface_missing': 'Magnitude (Surface) Missing'}
+
+
+# Distinct values, frequencies, null counts, min/max and quantiles for each column, computed the first time a page
+# asks for a column and then kept up to date by the catalog [PY3] [DA1 / DA4, see nuke_stats.find_unique_values]
+unique_data = snapshot.stats
+
+# Rows sorted by year (and by country, year) so the year slider is answered with binary searches instead of masks
+year_index = snapshot.year_index
+
+# Assign colors to each purpose for map markers and legend
+color_map = {
+            'Wr': 'green',
+            'We': 'darkpurple',
+            'Combat': 'darkred',
+            'Pne': 'pink',
+            'Se': 'blue',
+            'Fms': 'black',
+            'Pne:Plo': 'orange',
+            'Sam': 'cadetblue',
+            'Wr/Se': 'white',
+            'Others': 'gray'}
+# [PY5, accessed for map markers and legend below]
+
+
+# Marker styling for each map: stars colored by purpose on the overview, dark red pins per country
+map_styles = {
+            'overview': dict(zoom_start=2, color_map=color_map, icon='star', prefix='fa'),
+            'country': dict(zoom_start=3, color='darkred', icon='info-sign', prefix='glyphicon')}
+
+# More explosions than this are drawn as grid cells, which the user can drill into from a select box
+MAX_MAP_POINTS = 500
+
+
+# Columns the maps read: cell aggregates and marker popups (nuke_maps.POPUP_COLUMNS, without importing folium)
+MAP_COLUMNS = ['latitude', 'longitude', 'location', 'day', 'month', 'year', 'magnitude_body', 'magnitude_surface', 'purpose']
+
+
+# Explosions shown on a map before any drilling: a year range on the overview, one country on the country page. Only
+# the map columns of the selected rows are gathered from the shared frame
+def map_selection(page, params):
+    if page == 'overview':
+        return year_index.between(*params, columns=MAP_COLUMNS)
+    return year_index.group(params[0], columns=MAP_COLUMNS)
+
+
+# Rendered map documents kept on disk per (page, filter, drill path, dataset version, render version), so an identical
+# map is served without folium in every session, and again after the server restarts
+@st.cache_resource
+def get_map_cache():
+    return DiskLRUCache(os.environ.get('NUKES_MAP_CACHE_DIR', DATA_PATH.with_name('.map_cache')),
+                        max_bytes=int(os.environ.get('NUKES_MAP_CACHE_MB', 256)) * 2**20)
+
+map_cache = get_map_cache()
+
+# Digest of everything besides the data that goes into a map document: the styles, the aggregation thresholds, the
+# nuke_maps source (hashed rather than imported, so folium stays lazy) and the folium version. A deploy that changes any
+# of them doesn't get documents drawn by the old code from the disk cache
+map_render_settings = repr((map_styles, MAX_MAP_POINTS, CELL_LEVELS, metadata.version('folium'))).encode('utf-8')
+map_render_version = hashlib.sha256(map_render_settings + Path(__file__).with_name('nuke_maps.py').read_bytes()).hexdigest()[:16]
+
+# Height of the map frame in pixels
+MAP_HEIGHT = 700
+
+
+# Cell table (when aggregated), map HTML and number of explosions for a page, filter and drill path of cells. Only
+# called once the map is actually shown, and kept so moving the slider back to a range that was already drawn doesn't
+# look it up again
+@st.cache_resource(max_entries=64)
+def get_map_level(page, params, path, version):
+    data = map_selection(page, params)
+    for level, cell in enumerate(path):
+        data = rows_in_cell(data, cell, CELL_LEVELS[level])
+    total = len(data)
+    aggregated = total > MAX_MAP_POINTS and len(path) < len(CELL_LEVELS)
+    cells = aggregate_cells(data, CELL_LEVELS[len(path)]) if aggregated else None
+    if not aggregated and total > MAX_MAP_POINTS:
+        # A cell of the finest level can't be split further, so a seeded sample of its explosions is drawn instead
+        data = data.sample(MAX_MAP_POINTS, random_state=0).sort_index()
+
+    def render():
+        maps = timer.import_module('nuke_maps')
+        style = dict(map_styles[page], zoom_start=map_styles[page]['zoom_start'] + 3 * len(path))
+        # One clustered layer for every location, popups built column-wise [DA8]
+        m = maps.build_cell_map(cells, **style) if aggregated else maps.build_marker_map(data, **style)
+        return maps.map_html(m).encode('utf-8')
+
+    return cells, map_cache.get_or_create(('map', page, params, path, version, map_render_version), render).decode('utf-8'), total
+
+
+# Draws the map for a selection, offering one "Zoom into area" select box per aggregated level
+def show_map(page, params):
+    path = ()
+    with timer.section('map/build'):
+        cells, html, total = get_map_level(page, params, path, data_version)
+    while cells is not None:
+        areas = {"All areas": None}
+        for cell, row in cells.iterrows():
+            areas[f"{row['location']} ({row['latitude']:.1f}, {row['longitude']:.1f}): {row['count']} explosions"] = int(cell)
+        choice = areas[st.selectbox("Zoom into area:" if not path else "Zoom in further:", list(areas), key=f"{page}_cell_{len(path)}")]
+        if choice is None:
+            break
+        path += (choice,)
+        with timer.section(f'map/build_level_{len(path)}'):
+            cells, html, total = get_map_level(page, params, path, data_version)
+
+    if cells is not None:
+        st.caption(f"{int(cells['count'].sum())} explosions grouped into {len(cells)} areas, pick an area above to see individual markers")
+    elif total > MAX_MAP_POINTS:
+        st.caption(f"Showing a sample of {MAX_MAP_POINTS} of the {total} explosions in this area")
+    # st.iframe rather than st.html, which strips the scripts folium needs; nothing is read back from the map, so
+    # panning/zooming doesn't rerun the page
+    with timer.section('map/html'):
+        st.iframe(html, width=1000, height=MAP_HEIGHT)
+
+# Rows per page offered by result tables; tables up to the smallest size are shown whole
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+
+# Shows a table one page at a time with sort controls, so only the visible rows are serialized to the browser. A Query
+# is sorted and sliced server side (only the sort column is read for every matching row), a DataFrame in memory
+def show_table(source, key, index=None):
+    if isinstance(source, pd.DataFrame) and len(source) <= TABLE_PAGE_SIZES[0]:
+        st.write(source)
+        return
+    if isinstance(source, pd.DataFrame):
+        columns = list(source.columns)
+    else:
+        columns = ([index] if index else []) + source.columns
+
+    sort_col, order_col, size_col, page_col = st.columns(4)
+    sort_by = sort_col.selectbox("Sort by:", ["(file order)"] + columns, key=f"{key}_sort")
+    ascending = order_col.selectbox("Order:", ["Ascending", "Descending"], key=f"{key}_order") == "Ascending"
+    page_rows = size_col.selectbox("Rows per page:", TABLE_PAGE_SIZES, index=1, key=f"{key}_rows")
+    page_number = page_col.number_input("Page:", min_value=1, value=1, step=1, key=f"{key}_page")
+    sort_by = None if sort_by == "(file order)" else sort_by
+
+    def get_page(offset):
+        if isinstance(source, pd.DataFrame):
+            ordered = source if sort_by is None else source.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last')
+            return Page(ordered.iloc[offset:offset + page_rows], len(source), offset)
+        return source.page(offset, page_rows, sort_by, ascending, index=index)
+
+    with timer.section('table'):
+        page = get_page((page_number - 1) * page_rows)
+        last_page = max(1, -(-page.total // page_rows))
+        if page_number > last_page:  # the selection shrank under the page the user was on
+            page_number = last_page
+            page = get_page((page_number - 1) * page_rows)
+        st.dataframe(page.rows)
+    shown = f"{page.offset + 1:,}-{page.offset + len(page.rows):,}" if len(page.rows) else "0"
+    st.caption(f"Rows {shown} of {page.total:,} (page {page_number} of {last_page})")
+
+
+# Top/bottom 5 explosions by yield and magnitude statistics for every country, built by the catalog in one grouped
+# pass [DA2] [DA6] and formatted for display once per dataset version
+@st.cache_resource(max_entries=2)
+def get_country_summaries(_snapshot, version):
+    summaries = {}
+    for country, summary in _snapshot.summaries.items():
+        # Years had commas in them when displayed as numbers, so they're shown as strings (done once here, not per rerun)
+        top, bottom = [frame.astype({'year': str}).rename(columns=column_usf)
+                       for frame in analytics.yield_extremes(_snapshot, country)]
+        summaries[country] = summary._replace(top=top, bottom=bottom, magnitudes=analytics.magnitude_summary(_snapshot, country))
+    return summaries
+
+with timer.section('summaries'):
+    summaries_by_country = get_country_summaries(snapshot, data_version)
+
+
+# Explosions sorted by 1 degree grid cell for the radius, nearest and bounding box queries, built once per dataset
+# version (only when the Explosions Near a Place page is first opened)
+@st.cache_resource(max_entries=2)
+def get_point_index(_snapshot, version):
+    return PointIndex(_snapshot.frame)
+
+# Rendered chart images shared by every session, evicting the least recently used ones past the memory budget
+@st.cache_resource
+def get_figure_cache():
+    return LRUCache(max_bytes=int(os.environ.get('NUKES_FIGURE_CACHE_MB', 64)) * 2**20)
+
+figure_cache = get_figure_cache()
+
+
+# Charts are drawn in worker processes, so matplotlib and seaborn are never imported by the server itself and
+# sessions rendering at the same time use separate cores
+@st.cache_resource
+def get_render_pool():
+    return RenderPool(workers=int(os.environ.get('NUKES_RENDER_WORKERS', os.cpu_count() or 1)),
+                      timeout=float(os.environ.get('NUKES_RENDER_TIMEOUT', RENDER_TIMEOUT)))
+
+render_pool = get_render_pool()
+
+
+# Shows a chart image, rendered by nuke_charts.<figure_name>(make_data()) in the render pool only when (chart id,
+# parameters, dataset version) isn't in the figure cache yet. The chart's data is computed here, only on a miss
+def show_chart(chart_id, params, figure_name, make_data):
+    with timer.section(f'chart/{chart_id}'):
+        try:
+            image = figure_cache.get_or_create((chart_id, params, data_version),
+                                               lambda: render_pool.render(figure_name, make_data()))
+        except RenderTimeout:
+            image = None
+    if image is None:
+        st.warning("This chart is taking too long to draw, please try again in a moment.")
+    else:
+        st.image(image)
 
 # First Page
 
 def main_page():
     st.title("Data Overview")
 
-    # Grabs the name of each purpose
-    unique_purpose, x = find_unique_values(df_nuke, 'purpose')
-
-    # Assign colors to each purpose for map markers and legend
-    color_map = {
-                'Wr': 'green',
-                'We': 'darkpurple',
-                'Combat': 'darkred',
-                'Pne': 'pink',
-                'Se': 'blue',
-                'Fms': 'black',
-                'Pne:Plo': 'orange',
-                'Sam': 'cadetblue',
-                'Wr/Se': 'white',
-                'Others': 'gray'}
-    # [PY5, accessed for map markers and legend below]
-
     # Slider for year filter, used for map and time series chart
-    min_year = int(df_nuke['year'].min())  # [DA9 - calculations on DF columns]
-    max_year = int(df_nuke['year'].max())
+    min_year = int(unique_data['year'].min)  # [DA9 - calculations on DF columns]
+    max_year = int(unique_data['year'].max)
     selected_year = st.slider("Show explosions for range:", min_year, max_year, (min_year, max_year))  # [ST1, slider]
 
-    # Filters explosions by selected year range and only those in range show on map
-    filtered_explosions = df_nuke[(df_nuke['year'] >= selected_year[0]) & (df_nuke['year'] <= selected_year[1])]  # [DA4]
-
-    # Relevant content to display on each marker
-    unique_locations = filtered_explosions[['latitude', 'longitude', 'location', 'day', 'month', 'year', 'magnitude_body', 'magnitude_surface', 'purpose']].drop_duplicates()
-
-    # Creates folium map, taken from class example
-    m = folium.Map(location=[unique_locations['latitude'].mean(), unique_locations['longitude'].mean()],
-                   zoom_start=2, control_scale=True)
-
-    # Markers for each location and content from above
-    for i, row in unique_locations.iterrows(): # [DA8]
-        popup_content = f"Location: {row['location']}"
-        popup_content += f"<br>Date: {row['month']}/{row['day']}/{row['year']}"
-        popup_content += f"<br>Magnitude Body: {row['magnitude_body']}"
-        popup_content += f"<br>Magnitude Surface: {row['magnitude_surface']}"
-        popup_content += f"<br>Purpose: {row['purpose'].strip()}"
-        # Markers for each location, color based on color dict above with gray set as the default so "Others" don't actually need to be regrouped
-        folium.Marker(location=[row['latitude'], row['longitude']],
-                      popup=folium.Popup(popup_content, max_width=700),
-                      icon=folium.Icon(icon='star', color=color_map.get(row['purpose'], 'gray'), prefix='fa')).add_to(m)
-
     # Allows user to toggle map on or off to reduce clutter
     if st.checkbox("Show Map"):
-        st_folium(m, width=1000)  # [VIZ4]
+        show_map('overview', selected_year)  # [VIZ4]
 
         # Legend for marker colors
         with st.expander("Click to expand legend for purpose colors on map"):  # [ST2, drop down / expander]
             for purpose, color in color_map.items():
                 st.write(f"<span style='color:{color}'>■</span> {purpose}", unsafe_allow_html=True)
 
-    # Cold War influenced time series chart
-    def plot_time_series(data, x, y, hue, ax):
-        sns.lineplot(data=data, x=x, y=y, hue=hue, ax=ax) # ax allows you to display both USA and USSR
-        ax.set_xlabel('Year')
-        ax.set_ylabel('Number of Tests')
-        ax.legend(title='Country')
-
-    # Data parameter for time series
-    filtered_explosions = df_nuke[((df_nuke['year'] >= selected_year[0]) & (df_nuke['year'] <= selected_year[1]))
-                                  & ((df_nuke['country'] == 'USA') | (df_nuke['country'] == 'USSR'))]  # [DA5]
-
-    # Pairs the countries/years with the amount of occurrences (.size)
-    df_time_series = filtered_explosions.groupby(['year', 'country']).size().reset_index(name='count')
-    chart, ax = plt.subplots(figsize=(10, 6))
-    plot_time_series(df_time_series, 'year', 'count', 'country', ax)
-    st.subheader('Nuclear Deployments Over Time (USA v. USSR)')  # Opted for a subheader instead of chart title
-    st.pyplot(chart)  # [VIZ2]
-
-    # Isolating countries and using the dictionary for frequency / appearances
-    countries, countries_dict = find_unique_values(df_nuke, 'country')
+    # Cold War influenced time series chart, only redrawn for a year range that isn't in the figure cache. Pairs the
+    # countries/years with the amount of occurrences [DA5]
+    def time_series_data():
+        return analytics.time_series(snapshot, selected_year[0], selected_year[1], analytics.COLD_WAR_COUNTRIES)
 
-    # Turn dictionary into dataframe for table and chart
-    countries_table = pd.DataFrame(list(countries_dict.items()), columns=['Country', 'Deployment Count'])
-    countries_table.set_index('Country', inplace=True) # had issue with setting index above
-    countries_table.columns = ['Deployment Count']
+    st.subheader('Nuclear Deployments Over Time (USA v. USSR)')  # Opted for a subheader instead of chart title
+    show_chart('time_series', selected_year, 'time_series_figure', time_series_data)  # [VIZ2]
 
-    st.set_option('deprecation.showPyplotGlobalUse', False)  # Removes warning
+    # Isolating countries and using the dictionary for frequency / appearances, as a table for the chart
+    with timer.section('country_counts'):
+        countries_table = analytics.country_counts(snapshot)
 
     # Searches for a chart in the streamlit session
     if 'chart' not in st.session_state:
@@ -175,16 +326,11 @@ def main_page():
 
     # To be able to call the pie chart on button click
     def display_pie_chart():
-        plt.figure(figsize=(10, 10))
-        sns.set_palette("pastel")
-        #  Explode the overlapping entries out from other entries
-        explode = [0.15 if country == 'PAKIST' else .3 if country == "INDIA" else .1 if country == "UK" else .015 for country in countries_table.index]  # [Explode idea from ChatGPT, see Docs]
-        plt.pie(countries_table['Deployment Count'], labels=countries_table.index, autopct='%1.2f%%', startangle=90, explode=explode)
-        plt.axis('equal')  # For scaling
-        st.pyplot()  # [VIZ1]
+        show_chart('country_pie', (), 'pie_chart_figure', lambda: countries_table)  # [VIZ1]
 
     st.subheader('Nuclear Deployments Per Country')
-    st.table(countries_table)
+    with timer.section('table'):
+        st.table(countries_table)
 
     # Open and close pie chart with button, I wanted text to change depending on st.session state, but couldn't figure it out
     if st.button('Open/Close Table as Pie Chart'):
@@ -192,121 +338,92 @@ def main_page():
     if st.session_state.chart:
         display_pie_chart()
 
-    # Prepping data for heatmap
-    df_heatmap = df_nuke.dropna(subset=['type'])
-    heat_pivot = df_heatmap.pivot_table(index='country', columns='type', aggfunc='size', fill_value=0)
-
-    # Displays a Heatmap of the type occurrences in data
-    plt.figure(figsize=(10, 6))
-    sns.heatmap(heat_pivot, cmap='RdPu', annot=True, fmt='d', linewidths=.5)
-    plt.title('Nuclear Explosions by Type of Deployment')
-    plt.xlabel('Type of Deployment')
-    plt.ylabel('Country')
-    st.pyplot()  # [VIZ3]
+    # Heatmap of the type occurrences in data, doesn't depend on any widget so it is drawn once per dataset version
+    show_chart('type_heatmap', (), 'heatmap_figure', lambda: analytics.type_heatmap(snapshot))  # [VIZ3]
 
 # Second Page
 def country_data_page():
     st.title("Country Data Page")
 
     # Pulling the different countries from data
-    unique_countries, x = find_unique_values(df_nuke, 'country')
+    unique_countries = unique_data['country'].unique
     selected_country = st.sidebar.selectbox("Display Data for:", unique_countries)  # [ST3]
 
-    # Displays data for selected countries
+    # Displays data for selected countries, everything below the map is looked up from the precomputed summaries
     st.subheader(f"Displaying data for: {selected_country}")
-    selected_country_data = df_nuke[df_nuke['country'] == selected_country]
-    sorted_data = selected_country_data.sort_values(by='yield_lower', ascending=False)  # [DA2]
-
-    # Years had commas in it, removed with lambda function that turns x/year into a string and replaces it
-    sorted_data['year'] = sorted_data['year'].apply(lambda x: str(x).replace(',', ''))  # [DA1 lambda]
-
-    # Renamed columns using the user-friendly dictionary
-    sorted_data = sorted_data.rename(columns=column_usf)
+    summary = summaries_by_country[selected_country]
 
     # Set num explosions for PAKIS and INDIA which have under 5 entries, so the display doesn't say top 5 for all
-    num_explosions = len(sorted_data)
-
-    st.write(f"Showing Top {min(num_explosions, 5)} Largest Explosions by Yield for {selected_country}:")
-    st.write(sorted_data.head(min(num_explosions, 5)))  # [DA3]
-    st.write(f"Showing Top {min(num_explosions, 5)} Smallest Explosions by Yield for {selected_country}:")
-    st.write(sorted_data.tail(min(num_explosions, 5)))
-
-    # Pivot tables for magnitudes [DA6]
-    pivot_body = selected_country_data.pivot_table(index='country', values='magnitude_body',
-                                                   aggfunc=['mean', 'median', 'min', 'max', 'std'])
-    pivot_surface = selected_country_data.pivot_table(index='country', values='magnitude_surface',
-                                                      aggfunc=['mean', 'median', 'min', 'max', 'std'])
+    num_explosions = min(summary.count, 5)
 
-    # Rename columns to be User-Friendly
-    pivot_body.columns = ['Mean Magnitude (Body)', 'Median Magnitude (Body)', 'Minimum Magnitude (Body)',
-                          'Maximum Magnitude (Body)', 'Standard Deviation']
-    pivot_surface.columns = ['Mean Magnitude (Surface)', 'Median Magnitude (Surface)', 'Minimum Magnitude (Surface)',
-                             'Maximum Magnitude (Surface)', 'Standard Deviation']
+    with timer.section('tables'):
+        st.write(f"Showing Top {num_explosions} Largest Explosions by Yield for {selected_country}:")
+        show_table(summary.top, key='country_top')  # [DA3]
+        st.write(f"Showing Top {num_explosions} Smallest Explosions by Yield for {selected_country}:")
+        show_table(summary.bottom, key='country_bottom')
 
-    st.write("Summary of Explosion Magnitudes")
-    st.write(pivot_body)
-    st.write(pivot_surface)
+        st.write("Summary of Explosion Magnitudes")
+        st.write(summary.magnitudes['magnitude_body'])
+        st.write(summary.magnitudes['magnitude_surface'])
 
 
     # Display a map with explosions for only the selected country
-    m = folium.Map(location=[selected_country_data['latitude'].mean(), selected_country_data['longitude'].mean()],
-                   zoom_start=3, control_scale=True)
-
-    for i, row in selected_country_data.iterrows():
-        popup_content = f"Location: {row['location']}"
-        popup_content += f"<br>Date: {row['month']}/{row['day']}/{row['year']}"
-        popup_content += f"<br>Magnitude Body: {row['magnitude_body']}"
-        popup_content += f"<br>Magnitude Surface: {row['magnitude_surface']}"
-        popup_content += f"<br>Purpose: {row['purpose']}"
-        folium.Marker(location=[row['latitude'], row['longitude']],
-                      popup=folium.Popup(popup_content, max_width=700),
-                      icon=folium.Icon(color='darkred')).add_to(m)
     st.subheader(f'Map of All Nuclear Explosions Deployed by {selected_country}:')
-    st_folium(m, width=1000)
+    show_map('country', (selected_country,))
 
 # Third Page
 def make_form_page():
     st.title("Create Your Own Table and Chart")
 
-    unique_countries, _ = find_unique_values(df_nuke, 'country')
+    unique_countries = unique_data['country'].unique
     selected_countries = st.multiselect("Display Data for:", unique_countries)
 
     if selected_countries:
-        # Filter the dataframe based on selected countries
-        filtered = df_nuke[df_nuke['country'].isin(selected_countries)]
-        filtered.set_index('country', inplace=True)
+        # Optional filters on top of the countries, all combined into one lazy query. The country and year range are
+        # answered by the year index and the other filters only read their own column within those rows, so the
+        # full frame is never copied
+        query = Query(snapshot).where('country', 'in', selected_countries)
+        with st.expander("More filters"):
+            min_year, max_year = int(unique_data['year'].min), int(unique_data['year'].max)
+            year_range = st.slider("Years:", min_year, max_year, (min_year, max_year), key='form_years')
+            min_yield = st.number_input("Yield at least (kt):", min_value=0.0, value=None, help="Lower yield estimate")
+            max_yield = st.number_input("Yield at most (kt):", min_value=0.0, value=None, help="Upper yield estimate")
+            selected_purposes = st.multiselect("Purpose:", unique_data['purpose'].unique)
+        if year_range != (min_year, max_year):
+            query = query.where('year', 'between', year_range)
+        if min_yield is not None:
+            query = query.where('yield_lower', '>=', min_yield)
+        if max_yield is not None:
+            query = query.where('yield_upper', '<=', max_yield)
+        if selected_purposes:
+            query = query.where('purpose', 'in', selected_purposes)
 
         # Allow users to select columns for the table
         st.subheader("Select Table Columns")
-        columns_without_country = [col for col in filtered.columns.tolist() if col != 'country']  # Redundant because it's the index
+        columns_without_country = [col for col in snapshot.columns.tolist() if col != 'country']  # Redundant because it's the index
         selected_table_columns = st.multiselect("Select Columns:", columns_without_country)
 
 
         if selected_table_columns:
-            # Displays the selected columns in a table
-            table = filtered[selected_table_columns]
+            # Only the selected columns (and country, the index) are read, and only for the page on screen
+            table = query.select(selected_table_columns)
             table_name = st.text_input("Enter table name:")
             st.subheader(table_name)
-            st.write(table)
+            show_table(table, key='form_table', index='country')
 
-            # Allows users to export the table as an Excel sheet, called by button click [EXTRA - Tempfile]
-            def export_to_excel(table_df, table_name):
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:  # Creates a temporary file not deleted when closed and already in xlsx format,
-                    file_path = tmp_file.name  # Gets file path
-                    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-                        table_df.to_excel(writer, index=True)
-                info = open(file_path, "rb")
-                file_content = info.read()
-                return file_content, file_path
-
-            # Tuple with info used for download button
-            file_content, file_path = export_to_excel(table, table_name)
+            # Allows users to export the table, the file is only generated (in memory) once the button is clicked
+            export_format = st.selectbox("Download format:", list(EXPORT_FORMATS))
+            mime, suffix = EXPORT_FORMATS[export_format]
 
             # Download button [Syntax from stack overflow StackOverFlow]
-            st.download_button(label="Download Table as .xlsx", data=file_content, file_name=f"{table_name}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            def export():
+                with timer.section(f'export/{export_format}'):
+                    return export_table(table.to_frame(index='country'), export_format)
+
+            st.download_button(label=f"Download Table as {suffix}", data=export, file_name=f"{table_name}{suffix}", mime=mime)
 
         st.subheader("Create Chart")
-        selected_chart_columns = st.multiselect("Select Chart Columns:", filtered.columns.tolist())
+        selected_chart_columns = st.multiselect("Select Chart Columns:", columns_without_country)
 
         if selected_chart_columns:
             # Allow users to select columns for the chart
@@ -318,20 +435,23 @@ def make_form_page():
                 frequency_column = st.selectbox("Select column for Frequency Chart:", selected_chart_columns)
                 chart_type = st.radio("Select Chart Type:", ["Line Chart", "Bar Chart"])
 
-                unique_list, unique_values = unique_data[frequency_column] # [DA7, Frequency Count + Add/select columns above]
+                # Counts per value, rolled up from the count cube for year/country/purpose/type [DA7, Frequency Count + Add/select columns above]
+                frequencies = analytics.frequencies(snapshot, frequency_column)
 
                 # Make dataframe for frequency chart
-                frequency_df = pd.DataFrame({"Value": unique_list, "Frequency": [unique_values[val] for val in unique_list]})
+                frequency_df = pd.DataFrame({"Value": frequencies.index, "Frequency": frequencies.to_numpy()})
 
+                # Years as labels, so the axis doesn't format them like 1,945
                 if 'year' in frequency_column:
-                    frequency_df['Value'] = frequency_df['Value'].apply(lambda x: str(x).replace(',', ''))
+                    frequency_df['Value'] = frequency_df['Value'].astype(str)
 
                 # Makes the frequency chart
                 st.subheader(f"Frequency Chart for {frequency_column}")
-                if chart_type == "Bar Chart":
-                    st.bar_chart(frequency_df, x="Value", y="Frequency", use_container_width=True) # Use container width makes chart fit with the rest of the window
-                if chart_type == "Line Chart":
-                    st.line_chart(frequency_df, x="Value", y="Frequency", use_container_width=True)
+                with timer.section('chart/frequency'):
+                    if chart_type == "Bar Chart":
+                        st.bar_chart(frequency_df, x="Value", y="Frequency", use_container_width=True) # Use container width makes chart fit with the rest of the window
+                    if chart_type == "Line Chart":
+                        st.line_chart(frequency_df, x="Value", y="Frequency", use_container_width=True)
 
             else:
                 with st.expander("Chart Making Guidelines"):
@@ -358,13 +478,66 @@ def make_form_page():
                 x_axis_column = st.selectbox("Select X-axis Column:", selected_chart_columns)
                 y_axis_column = st.selectbox("Select Y-axis Column:", selected_chart_columns)
 
-                # make chart depending on what type and columns art picked
-                if chart_type == "Line Chart":
-                    st.line_chart(filtered, x=x_axis_column, y=y_axis_column, use_container_width=True)
-                elif chart_type == "Bar Chart":
-                    st.bar_chart(filtered, x=x_axis_column, y=y_axis_column, use_container_width=True)
-                elif chart_type == "Scatter Plot":
-                    st.scatter_chart(filtered, x=x_axis_column, y=y_axis_column, use_container_width=True)
+                # make chart depending on what type and columns art picked, reading only the two chart columns
+                with timer.section('filter'):
+                    filtered = query.select(list(dict.fromkeys([x_axis_column, y_axis_column]))).to_frame(index='country')
+
+                # Reduced to a bounded number of points before plotting: LTTB for lines, bars summed (and binned) per
+                # x value, a stratified sample for scatter plots
+                with timer.section('downsample'):
+                    chart_kind = {"Line Chart": 'line', "Bar Chart": 'bar', "Scatter Plot": 'scatter'}[chart_type]
+                    points = downsample(filtered, chart_kind, x_axis_column, y_axis_column)
+                with timer.section('chart/custom'):
+                    if chart_type == "Line Chart":
+                        st.line_chart(points.data, x=points.x, y=points.y, use_container_width=True)
+                    elif chart_type == "Bar Chart":
+                        st.bar_chart(points.data, x=points.x, y=points.y, use_container_width=True)
+                    elif chart_type == "Scatter Plot":
+                        st.scatter_chart(points.data, x=points.x, y=points.y, use_container_width=True)
+                if points.method == 'binned':
+                    st.caption(f"{points.shown:,} bars summing {points.total:,} rows")
+                else:
+                    reduction = {'none': "", 'lttb': " (LTTB)", 'stratified': " (stratified sample)"}[points.method]
+                    st.caption(f"Showing {points.shown:,} of {points.total:,} points{reduction}")
+
+# Fourth Page
+def near_page():
+    st.title("Explosions Near a Place")
+
+    with timer.section('point_index'):
+        point_index = get_point_index(snapshot, data_version)
+
+    query_type = st.radio("Find:", ["Within a distance", "Nearest explosions", "Inside a box"], horizontal=True)
+    if query_type == "Inside a box":
+        south_col, west_col, north_col, east_col = st.columns(4)
+        south = south_col.number_input("South latitude:", -90.0, 90.0, 30.0)
+        west = west_col.number_input("West longitude:", -180.0, 180.0, -120.0)
+        north = north_col.number_input("North latitude:", -90.0, 90.0, 40.0)
+        east = east_col.number_input("East longitude:", -180.0, 180.0, -110.0)
+        with timer.section('spatial_query'):
+            hits = point_index.in_bbox(south, west, north, east)
+    else:
+        # Defaults to the Nevada Test Site
+        lat_col, lon_col, value_col = st.columns(3)
+        lat = lat_col.number_input("Latitude:", -90.0, 90.0, 37.1)
+        lon = lon_col.number_input("Longitude:", -180.0, 180.0, -116.05)
+        with timer.section('spatial_query'):
+            if query_type == "Within a distance":
+                hits = point_index.within_radius(lat, lon, value_col.number_input("Distance (km):", 0.0, 20040.0, 100.0))
+            else:
+                hits = point_index.nearest(lat, lon, value_col.number_input("Number of explosions:", 1, 1000, 10))
+
+    summary = point_index.summary(hits)
+    count_col, yield_col, magnitude_col = st.columns(3)
+    count_col.metric("Explosions", f"{summary.count:,}")
+    yield_col.metric("Total Yield (Upper)", f"{summary.yield_upper_total:,.1f} kt")
+    magnitude_col.metric("Magnitude (Body) Range", "n/a" if pd.isna(summary.magnitude_min)
+                         else f"{summary.magnitude_min:.1f} - {summary.magnitude_max:.1f}")
+
+    if summary.count:
+        rows = point_index.rows(hits)
+        st.map(rows, latitude='latitude', longitude='longitude')
+        show_table(rows.rename(columns=column_usf | {'distance_km': 'Distance (km)'}), key='near_table')
 
 # Introduction
 def intro_page():
@@ -382,6 +555,7 @@ def intro_page():
         - Get a general idea of the data via the "Data Overview" page's map, visualizations and table.
         - Look closer at individual countries' explosion data on the "Individual Country Data" page. 
         - Create your own tables and charts on the "Customized Queries" page to analyze specific pieces of the data. 
+        - Find the explosions around a point or inside an area on the "Explosions Near a Place" page.
 
         **About the Data:**
         This application uses a dataset with information on historical nuclear explosions from 1945 to 1998.
@@ -403,11 +577,15 @@ def intro_page():
         14. **Day**: Day of the explosion.
         15. **Month**: Month of the explosion.
         16. **Year**: Year of the explosion.
+        17. **Date**: Day, month and year combined into one date.
+        18. **Magnitude (Body/Surface) Missing**: Whether that magnitude was not measured (recorded as 0).
 
         """)
 
 # Load selected page, main navigation
-selected_page = st.radio("Page Navigation", ["Introduction", "Data Overview", "Individual Country Data", "Customized Queries"])  # [ST4, Navigation]
+selected_page = st.radio("Page Navigation", ["Introduction", "Data Overview", "Individual Country Data", "Customized Queries",
+                                            "Explosions Near a Place"])  # [ST4, Navigation]
+timer.page = selected_page
 
 if selected_page == "Data Overview":
     main_page()
@@ -415,5 +593,26 @@ elif selected_page == "Individual Country Data":
     country_data_page()
 elif selected_page == "Customized Queries":
     make_form_page()
+elif selected_page == "Explosions Near a Place":
+    near_page()
 elif selected_page == "Introduction":
     intro_page()
+
+# Debug panel with this rerun's section timings (the panel itself isn't timed)
+total_seconds = timer.finish()
+if debug_panel:
+    with st.sidebar.expander("Rerun timings", expanded=True):
+        st.caption(f"{selected_page}: {total_seconds * 1000:.1f} ms total, figure cache hit rate "
+                   f"{figure_cache.stats()['hit_rate']:.0%}, map cache hit rate {map_cache.stats()['hit_rate']:.0%}, "
+                   f"{render_pool.stats()['timeouts']} chart render timeouts")
+        st.dataframe(pd.DataFrame(timer.records(), columns=['section', 'ms', 'blocks']), hide_index=True)
+        shared, own = snapshot_memory(snapshot), session_memory(st.session_state)
+        st.caption(f"Shared dataset: {format_bytes(shared.sum())} (" +
+                   ", ".join(f"{component} {format_bytes(n)}" for component, n in shared.items()) +
+                   f"), this session's own state: {format_bytes(own.sum())}")
+        rejected = catalog.rejected
+        if len(rejected):
+            st.caption(f"{len(rejected)} new rows could not be ingested:")
+            st.dataframe(rejected, hide_index=True)
+        st.caption("Modules imported on first use by this process: " +
+                   (", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in IMPORT_TIMES.items()) or "none yet"))
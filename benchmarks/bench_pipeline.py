@@ -0,0 +1,190 @@
+"""
+Times each stage of the app's compute pipeline at scaled data sizes.
+
+    python benchmarks/bench_pipeline.py                      # 1x 10x 100x 1000x, results/<commit>.json
+    python benchmarks/bench_pipeline.py --scales 1 10 --repeat 5
+    python benchmarks/bench_pipeline.py --compare results/abc1234.json results/def5678.json
+
+Every stage records its best wall time over --repeat runs and the peak memory allocated while it ran (tracemalloc, in
+a separate run). 1x is the bundled CSV; larger scales are seeded synthetic catalogs of factor x its row count (see
+nuke_synth.py). load_clean is a full Catalog load, so it includes building the year index, count cube and
+per-country summaries. --compare prints the ratio per stage and exits non-zero when a stage got slower than --threshold.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import nuke_analytics as analytics  # noqa: E402
+from nuke_catalog import Catalog  # noqa: E402
+from nuke_cube import CUBE_DIMENSIONS, CountCube  # noqa: E402
+from nuke_data import DATA_PATH  # noqa: E402
+from nuke_downsample import downsample  # noqa: E402
+from nuke_export import export_table  # noqa: E402
+from nuke_maps import build_cell_map, build_marker_map, map_html  # noqa: E402
+from nuke_query import Query  # noqa: E402
+from nuke_render import render_chart  # noqa: E402
+from nuke_spatial import CELL_LEVELS, PointIndex, aggregate_cells  # noqa: E402
+from nuke_stats import ColumnStatsIndex, country_summaries  # noqa: E402
+from nuke_synth import fit_model, write_catalog  # noqa: E402
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+DEFAULT_SCALES = (1, 10, 100, 1000)
+
+# Same threshold the app uses to switch a map to grid cells
+MAX_MAP_POINTS = 500
+
+# Slider ranges replayed by the year-filter stage
+YEAR_RANGES = [(1945, 1998), (1950, 1960), (1962, 1962), (1970, 1990), (1985, 1998)]
+
+
+# Best wall time over `repeat` untraced runs, plus the peak memory of one extra run under tracemalloc (kept out of the
+# timings because tracing slows allocation-heavy stages down several times)
+def measure(stage, repeat):
+    tracemalloc.start()
+    result = stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        best = min(best, time.perf_counter() - start)
+    return result, {'seconds': best, 'peak_bytes': peak}
+
+
+# Map as the app builds it: grid cells over MAX_MAP_POINTS rows, clustered markers otherwise
+def render_map(rows, **style):
+    if len(rows) > MAX_MAP_POINTS:
+        m = build_cell_map(aggregate_cells(rows, CELL_LEVELS[0]), **style)
+    else:
+        m = build_marker_map(rows, **style)
+    return len(map_html(m))
+
+
+def run_scale(csv_path, args):
+    stages = {}
+    catalog, stages['load_clean'] = measure(lambda: Catalog(csv_path), args.repeat)
+    snapshot = catalog.snapshot
+    frame = snapshot.frame
+
+    def unique_data():
+        index = ColumnStatsIndex(frame)
+        return [index[column] for column in frame.columns]
+
+    _, stages['unique_data'] = measure(unique_data, args.repeat)
+    _, stages['year_filter'] = measure(lambda: [len(snapshot.year_index.between(*years)) for years in YEAR_RANGES], args.repeat)
+    _, stages['map_overview'] = measure(lambda: render_map(snapshot.year_index.between(1945, 1998)), args.repeat)
+    _, stages['map_country'] = measure(lambda: render_map(snapshot.year_index.group('USA'), zoom_start=3, color='darkred'), args.repeat)
+    if len(frame) <= args.max_marker_rows:
+        _, stages['markers_all_rows'] = measure(lambda: len(map_html(build_marker_map(frame))), args.repeat)
+    _, stages['time_series'] = measure(lambda: analytics.time_series(snapshot, 1945, 1998), args.repeat)
+    _, stages['heatmap_pivot'] = measure(lambda: analytics.type_heatmap(snapshot), args.repeat)
+    _, stages['chart_render'] = measure(lambda: [len(render_chart(name, data)) for name, data in (
+        ('time_series_figure', analytics.time_series(snapshot, 1945, 1998)),
+        ('pie_chart_figure', analytics.country_counts(snapshot)),
+        ('heatmap_figure', analytics.type_heatmap(snapshot)))], args.repeat)
+    _, stages['frequencies'] = measure(lambda: [analytics.frequencies(snapshot, column) for column in CUBE_DIMENSIONS],
+                                       args.repeat)
+    _, stages['count_cube'] = measure(lambda: CountCube.from_frame(frame), args.repeat)
+    _, stages['country_pivots'] = measure(lambda: country_summaries(frame), args.repeat)
+    form_query = (Query(snapshot).where('country', 'in', ['USA', 'UK']).where('year', 'between', (1960, 1980))
+                  .where('yield_upper', '<=', 20).select(['name', 'year', 'yield_upper']))
+    _, stages['form_query'] = measure(lambda: form_query.to_frame(index='country'), args.repeat)
+    all_rows = Query(snapshot).select(list(frame.columns.drop('country')))
+    for kind in ('line', 'bar', 'scatter'):
+        _, stages[f'downsample_{kind}'] = measure(lambda: downsample(frame, kind, 'year', 'yield_upper'), args.repeat)
+    _, stages['table_page'] = measure(lambda: all_rows.page(1000, 50, sort_by='yield_upper', index='country'), args.repeat)
+    point_index, stages['point_index'] = measure(lambda: PointIndex(frame), args.repeat)
+    _, stages['spatial_query'] = measure(lambda: [point_index.summary(hits) for hits in (
+        point_index.within_radius(37.1, -116.05, 100), point_index.nearest(49.9, 78.0, 10),
+        point_index.in_bbox(-25, -140, -20, -135))], args.repeat)
+    if len(frame) <= args.max_export_rows:
+        table = frame.set_index('country')
+        _, stages['excel_export'] = measure(lambda: len(export_table(table, 'xlsx')), args.repeat)
+    return len(frame), stages
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args):
+    raw = pd.read_csv(args.data)
+    model = fit_model(raw)
+    results = {'commit': git_commit(), 'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'pandas': pd.__version__, 'repeat': args.repeat, 'scales': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in args.scales:
+            csv_path = Path(tmp) / f'nukes_{factor}x.csv'
+            if factor == 1:
+                raw.to_csv(csv_path, index=False)
+            else:
+                write_catalog(csv_path, factor * len(raw), seed=args.seed, model=model)
+            rows, stages = run_scale(csv_path, args)
+            results['scales'][str(factor)] = {'rows': rows, 'stages': stages}
+            for name, stage in stages.items():
+                print(f"{factor:>5}x {rows:>10,} rows  {name:<18} {stage['seconds'] * 1000:>10.1f} ms"
+                      f"  {stage['peak_bytes'] / 2**20:>9.1f} MiB peak")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"results written to {output}")
+
+
+# Stage-by-stage time ratio of two result files; True if any stage regressed past the threshold
+def compare(base_path, new_path, threshold):
+    base, new = json.loads(Path(base_path).read_text()), json.loads(Path(new_path).read_text())
+    regressed = False
+    for factor, scale in new['scales'].items():
+        base_stages = base['scales'].get(factor, {}).get('stages', {})
+        for name, stage in scale['stages'].items():
+            if name not in base_stages:
+                continue
+            ratio = stage['seconds'] / max(base_stages[name]['seconds'], 1e-9)
+            flag = ''
+            if ratio > threshold:
+                flag, regressed = '  REGRESSION', True
+            print(f"{factor:>5}x {name:<18} {base_stages[name]['seconds'] * 1000:>10.1f} ms -> "
+                  f"{stage['seconds'] * 1000:>10.1f} ms  x{ratio:.2f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's compute pipeline at scaled data sizes.")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-marker-rows', type=int, default=50_000, help="skip the all-rows marker map above this")
+    parser.add_argument('--max-export-rows', type=int, default=50_000, help="skip the Excel export above this")
+    parser.add_argument('--output', default=None, help="results file (default: results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two results files instead")
+    parser.add_argument('--threshold', type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Streamlit-free analytics over the explosions catalog.
+
+Every function takes a dataset handle (a nuke_catalog.Snapshot, see open_dataset) and returns plain pandas objects,
+so the aggregations behind the app's pages can be run from scripts, offline jobs and benchmarks. nuke_cli.py exposes
+them on the command line. Explosion counts are roll-ups of the snapshot's count cube (nuke_cube) rather than groupbys
+over the rows.
+"""
+
+import pandas as pd
+
+from nuke_catalog import Catalog
+from nuke_data import DATA_PATH
+
+
+# The two countries compared on the Data Overview time series
+COLD_WAR_COUNTRIES = ('USA', 'USSR')
+
+
+def open_dataset(path=DATA_PATH, incoming_dir=None, k=5):
+    return Catalog(path, incoming_dir=incoming_dir, k=k).refresh()
+
+
+def year_range(handle):
+    return int(handle.stats['year'].min), int(handle.stats['year'].max)
+
+
+# Distinct values of a column (in order of first appearance) and their frequencies
+def unique_values(handle, column):
+    stats = handle.stats[column]
+    return stats.unique, stats.counts
+
+
+def column_summary(handle, column):
+    stats = handle.stats[column]
+    return {'distinct': len(stats.counts), 'nulls': stats.nulls, 'min': stats.min, 'max': stats.max,
+            'quantiles': stats.quantiles}
+
+
+# Number of explosions per value of a column, sorted by value: a roll-up of the count cube for its dimensions (year,
+# country, purpose, type), the column statistics' counts for any other column
+def frequencies(handle, column):
+    if column in handle.cube.dimensions:
+        return handle.cube.rollup(column)
+    return pd.Series(handle.stats[column].counts, name='count').rename_axis(column).sort_index()
+
+
+# Number of explosions per (year, country) for a year range
+def time_series(handle, start=None, end=None, countries=COLD_WAR_COUNTRIES):
+    default_start, default_end = year_range(handle)
+    start = default_start if start is None else start
+    end = default_end if end is None else end
+    cube = handle.cube.between('year', start, end)
+    if countries:
+        cube = cube.isin('country', countries)
+    return cube.rollup(['year', 'country']).reset_index(name='count')
+
+
+# Deployment count per country, most deployments first
+def country_counts(handle):
+    counts = handle.cube.rollup('country').sort_values(ascending=False, kind='stable')
+    return counts.rename_axis('Country').to_frame('Deployment Count')
+
+
+# Country x deployment type counts
+def type_heatmap(handle):
+    counts = handle.cube.rollup(['country', 'type'])
+    return counts[counts.index.get_level_values('type').notna()].unstack('type', fill_value=0)
+
+
+# Values each cleaning step changed or flagged, per column, over every row of the catalog
+def cleaning_report(handle):
+    return handle.cleaning
+
+
+# Top and bottom explosions by yield for a country, largest first
+def yield_extremes(handle, country):
+    summary = handle.summaries[country]
+    return summary.top, summary.bottom
+
+
+# Mean/median/min/max/std of both magnitude columns for a country, with user-friendly column names
+def magnitude_summary(handle, country):
+    summary = handle.summaries[country]
+    tables = {}
+    for column, label in (('magnitude_body', 'Body'), ('magnitude_surface', 'Surface')):
+        tables[column] = summary.magnitudes[column].set_axis(
+            [f'Mean Magnitude ({label})', f'Median Magnitude ({label})', f'Minimum Magnitude ({label})',
+             f'Maximum Magnitude ({label})', 'Standard Deviation'], axis=1)
+    return tables
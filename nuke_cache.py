@@ -0,0 +1,173 @@
+"""
+Byte caches shared by every session of the app.
+
+LRUCache keeps rendered artefacts (chart images) in memory under a byte budget, evicting the least recently used
+entries first and counting hits and misses so the budget can be tuned.
+
+DiskLRUCache does the same with one file per entry in a directory, so rendered documents (map HTML) survive server
+restarts. File modification times record recency: they are refreshed on every hit and read back when the cache is
+opened, so eviction order carries over too. Writes go through a temporary file and os.replace, so a reader never sees
+a half-written entry.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> bytes, least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            if len(value) > self.max_bytes:  # would evict everything and still not fit
+                return
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    # Cached bytes for key, calling create() to produce them on a miss. Two sessions missing on the same key at
+    # once may both create it; the lock is not held while rendering so one slow render doesn't block every hit.
+    def get_or_create(self, key, create):
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class DiskLRUCache:
+    SUFFIX = '.bin'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # file name -> size, least recently used first, rebuilt from what earlier runs left behind
+        files = []
+        for path in self.directory.glob(f'*{self.SUFFIX}'):
+            stat = path.stat()
+            files.append((stat.st_mtime_ns, path.name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._size = sum(self._entries.values())
+        with self._lock:
+            self._evict()
+
+    # Keys are hashed into file names, so they must have a stable repr (tuples of strings and numbers)
+    def _name(self, key):
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + self.SUFFIX
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._name(key) in self._entries
+
+    def get(self, key):
+        name = self._name(key)
+        with self._lock:
+            if name not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+        path = self.directory / name
+        try:
+            value = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:  # removed by hand or by another process sharing the directory
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        name = self._name(key)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            f.write(value)
+        os.replace(f.name, self.directory / name)
+        with self._lock:
+            self._size += len(value) - self._entries.pop(name, 0)
+            self._entries[name] = len(value)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            (self.directory / name).unlink(missing_ok=True)
+
+    # Same as LRUCache.get_or_create: the lock is not held while create() runs
+    def get_or_create(self, key, create):
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            for name in self._entries:
+                (self.directory / name).unlink(missing_ok=True)
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,281 @@
+"""
+Long-lived, incrementally updated view of the explosions catalog.
+
+The catalog is loaded once; afterwards refresh() only looks for rows appended to the CSV (read from the last byte
+offset on) and for new files dropped into an incoming directory. New rows are de-duplicated against a sorted array of
+row fingerprints, and the column statistics, year index, count cube and per-country summaries are updated from the
+new rows instead of being rebuilt. If the CSV is rewritten rather than appended to, or the columnar sidecar it was
+loaded from is rewritten or stops being the preferred source (nuke_data.resolve_source), the catalog falls back to a
+full reload.
+
+New rows are parsed leniently, like the cleaning steps do. A row that still can't take the catalog's column types (a
+blank, unparseable or out-of-range value in a column loaded as integers, or a line with the wrong number of fields) is
+skipped and kept in Catalog.rejected instead of failing the refresh. The CSV read position and the processed incoming
+files only move on once their rows were ingested, so a batch that fails for another reason is read again on the next
+refresh.
+
+Each refresh publishes a new immutable Snapshot, so a page rerun that grabbed the previous one keeps a consistent
+view while another session ingests. A snapshot's version also digests the fingerprints of every row ingested since the
+load, so it names the same rows after a server restart and can key caches that outlive the process.
+"""
+
+import csv
+import functools
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from nuke_cube import CountCube
+from nuke_data import (DATA_PATH, RENAME_COLUMNS, SCHEMA, clean_with_report, coerce_numeric, dataset_version,
+                       merge_cleaning_reports, read_raw, resolve_source)
+from nuke_index import YearIndex
+from nuke_stats import ColumnStatsIndex, country_summaries, merge_country_summaries
+
+
+# Files picked up from the incoming directory
+INCOMING_SUFFIXES = ('.csv', '.parquet', '.feather')
+
+# Bytes before the last read offset that must be unchanged for the CSV to count as appended to
+TAIL_BYTES = 4096
+
+
+# The rows live in the year index's frames (the loaded frame plus, after ingests, a small frame of the newer rows),
+# so ingesting doesn't copy the whole table; the single `frame` is only assembled (and kept) when it is asked for
+class Snapshot:
+    def __init__(self, version, stats, year_index, summaries, cube, cleaning):
+        self.version = version
+        self.stats = stats  # nuke_stats.ColumnStatsIndex
+        self.year_index = year_index  # nuke_index.YearIndex
+        self.summaries = summaries  # country -> nuke_stats.CountrySummary
+        self.cube = cube  # nuke_cube.CountCube
+        self.cleaning = cleaning  # nuke_data cleaning report over every row in the frame
+
+    @property
+    def columns(self):
+        return self.year_index.columns
+
+    def __len__(self):
+        return len(self.year_index)
+
+    @functools.cached_property
+    def frame(self):
+        return self.year_index.frame()
+
+
+# One 64-bit hash per row over its values, used to spot rows that are already in the catalog
+def row_fingerprints(raw):
+    return pd.util.hash_pandas_object(raw, index=False).to_numpy()
+
+
+class Catalog:
+    def __init__(self, path=DATA_PATH, incoming_dir=None, k=5):
+        self.path = Path(path)
+        self.incoming_dir = Path(incoming_dir) if incoming_dir else None
+        self.k = k
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    # Raw (CSV-named) rows that refresh()/ingest() skipped since the last load, with the reason in a 'reason' column
+    @property
+    def rejected(self):
+        if not self._rejected:
+            return pd.DataFrame(columns=list(self._raw_dtypes) + ['reason'])
+        return pd.concat(self._rejected, ignore_index=True)
+
+    def _load(self):
+        self._source = resolve_source(self.path)
+        stat = os.stat(self._source)
+        self._source_state = (stat.st_mtime_ns, stat.st_size)
+        raw = read_raw(self._source)
+        self._raw_dtypes = raw.dtypes.to_dict()
+        fingerprints = row_fingerprints(raw)
+        first = ~pd.Series(fingerprints).duplicated().to_numpy()
+        self._fingerprints = np.sort(fingerprints[first])
+
+        # Fingerprints already dropped duplicates, and the rows are only copied when there were any
+        frame, cleaning = clean_with_report(raw if first.all() else raw[first], dedupe=False)
+        self._base_version = dataset_version(self.path)
+        self._generation = 0
+        self._ingested = ''  # digest chained over the fingerprints of each ingested batch
+        self._processed = set()
+        self._rejected = []
+        self._remember_csv_position()
+        year_index = YearIndex(frame, column='year', by='country')
+        self._snapshot = Snapshot(self._base_version, ColumnStatsIndex(frame), year_index,
+                                  country_summaries(frame, k=self.k), CountCube.from_frame(frame), cleaning)
+
+    def _remember_csv_position(self):
+        if not self.path.exists():
+            self._csv_state = self._offset = None
+            self._tail = b''
+            return
+        stat = os.stat(self.path)
+        self._csv_state = (stat.st_mtime_ns, stat.st_size)
+        self._offset = stat.st_size
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, self._offset - TAIL_BYTES))
+            self._tail = f.read(self._offset - f.tell())
+
+    # Whether the catalog has to be reloaded because a different file is now preferred (a sidecar appeared or went
+    # stale) or the sidecar it was loaded from was rewritten. Appends to a loaded CSV are left to _read_appended.
+    def _source_changed(self):
+        source = resolve_source(self.path)
+        if source != self._source:
+            return True
+        if source == self.path or not source.exists():
+            return False
+        stat = os.stat(source)
+        return (stat.st_mtime_ns, stat.st_size) != self._source_state
+
+    # (raw rows appended to the CSV since the last read or None, read position after them), None when the file is
+    # unchanged, or False when it was rewritten and has to be reloaded. The position is only committed by refresh()
+    # once the rows were ingested.
+    def _read_appended(self):
+        if not self.path.exists() or self._offset is None:
+            return None
+        stat = os.stat(self.path)
+        if (stat.st_mtime_ns, stat.st_size) == self._csv_state:
+            return None
+        if stat.st_size < self._offset:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset - len(self._tail))
+            if f.read(len(self._tail)) != self._tail:
+                return False
+            appended = f.read(stat.st_size - self._offset)
+
+        # Only consume whole lines, a writer may be in the middle of the last one
+        complete = appended[:appended.rfind(b'\n') + 1]
+        position = (self._offset + len(complete), (self._tail + complete)[-TAIL_BYTES:],
+                    (stat.st_mtime_ns, stat.st_size) if len(complete) == len(appended) else None)
+        if not complete.strip():
+            return None, position
+        return self._parse_lines(complete), position
+
+    # CSV lines as raw rows. Text columns are read as text (a name like "123" stays a string). Lines with more or fewer
+    # fields than the header are kept as rows with a 'reason' column, for _conform to reject: pandas would otherwise
+    # pad a short line with missing values, or take the extra leading fields of a long one as the index and shift
+    # every column
+    def _parse_lines(self, lines):
+        names = list(self._raw_dtypes)
+        records = [record for record in csv.reader(io.StringIO(lines.decode('utf-8'))) if record]
+        complete = [record for record in records if len(record) == len(names)]
+        malformed = [record for record in records if len(record) != len(names)]
+        raw = pd.DataFrame(columns=names)
+        if complete:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(complete)
+            buffer.seek(0)
+            text = {column: str for column, dtype in self._raw_dtypes.items()
+                    if not pd.api.types.is_numeric_dtype(dtype)}
+            raw = pd.read_csv(buffer, header=None, names=names, dtype=text, index_col=False)
+        if not malformed:
+            return raw
+        fields = pd.DataFrame([record[:len(names)] for record in malformed]).reindex(columns=range(len(names)))
+        return pd.concat([raw, fields.set_axis(names, axis=1).assign(reason='malformed line')], ignore_index=True)
+
+    # (key, raw rows) of every file in the incoming directory that wasn't ingested yet; refresh() marks a file
+    # processed once its rows were ingested
+    def _read_incoming(self):
+        if self.incoming_dir is None or not self.incoming_dir.is_dir():
+            return
+        for file in sorted(self.incoming_dir.iterdir()):
+            if file.suffix not in INCOMING_SUFFIXES:
+                continue
+            stat = file.stat()
+            key = (file.name, stat.st_mtime_ns, stat.st_size)
+            if key not in self._processed:
+                yield key, read_raw(file)
+
+    # Checks the CSV and incoming directory and ingests whatever is new. Cheap (a couple of stat calls) when nothing
+    # changed; returns the current snapshot either way.
+    def refresh(self):
+        with self._lock:
+            appended = False if self._source_changed() else self._read_appended()
+            if appended is False:
+                self._load()
+                appended = None
+            if appended is not None:
+                raw, position = appended
+                if raw is not None:
+                    self._ingest(raw)
+                self._offset, self._tail, self._csv_state = position
+            for key, raw in self._read_incoming():
+                self._ingest(raw)
+                self._processed.add(key)
+            return self._snapshot
+
+    # Adds raw (CSV-named) rows that aren't in the catalog yet; returns how many were new
+    def ingest(self, raw):
+        with self._lock:
+            return self._ingest(raw)
+
+    # (rows, rejected): the raw rows with the dtypes the catalog was loaded with, so their fingerprints line up with the
+    # loaded rows', and the rows that can't take them plus a 'reason' column. Numbers are parsed like the
+    # coerce_numeric cleaning step does; a missing or fractional value in a column loaded as integers can't be cast, and
+    # neither can a value outside the range of the schema's integer type for it (a month of 1970 in an int8).
+    def _conform(self, raw):
+        reasons = raw['reason'] if 'reason' in raw.columns else pd.Series(None, index=raw.index, dtype=object)
+        original = raw.reindex(columns=list(self._raw_dtypes))
+        numeric = [column for column, dtype in self._raw_dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+        raw, _ = coerce_numeric(original, numeric)
+        for column, dtype in self._raw_dtypes.items():
+            if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+                values = raw[column]
+                unusable = reasons.isna() & (values.isna() | (values % 1 != 0))
+                reasons = reasons.mask(unusable, f'{column} is missing or not an integer')
+                # The loaded rows have the schema's small integer type, which a value past its range would wrap around
+                schema_dtype = SCHEMA.get(RENAME_COLUMNS.get(column, column))
+                if schema_dtype is not None and pd.api.types.is_integer_dtype(pd.api.types.pandas_dtype(schema_dtype)):
+                    bounds = np.iinfo(schema_dtype)
+                    unusable = reasons.isna() & ((values < bounds.min) | (values > bounds.max))
+                    reasons = reasons.mask(unusable, f'{column} is out of range')
+        rejected = reasons.notna().to_numpy()
+        return raw[~rejected].astype(self._raw_dtypes), original[rejected].assign(reason=reasons[rejected])
+
+    # Ingests a batch as a whole: the catalog's state is only replaced once the new snapshot is built
+    def _ingest(self, raw):
+        raw, rejected = self._conform(raw)
+        fingerprints = row_fingerprints(raw)
+        positions = np.searchsorted(self._fingerprints, fingerprints)
+        known = np.zeros(len(fingerprints), dtype=bool)
+        in_range = positions < len(self._fingerprints)
+        known[in_range] = self._fingerprints[positions[in_range]] == fingerprints[in_range]
+        new = ~known & ~pd.Series(fingerprints).duplicated().to_numpy()
+        if not new.any():
+            self._reject(rejected)
+            return 0
+        added = np.sort(fingerprints[new])
+
+        old = self._snapshot
+        rows, cleaning = clean_with_report(raw[new], dedupe=False)
+        rows.index = pd.RangeIndex(len(old), len(old) + len(rows))
+        year_index = old.year_index.extended(rows)
+
+        # Only the countries that got new rows are updated, each from its old top/bottom rows and the new rows
+        summaries = dict(old.summaries)
+        for country, summary in country_summaries(rows, k=self.k).items():
+            summaries[country] = (merge_country_summaries(summaries[country], summary, k=self.k)
+                                  if country in summaries else summary)
+
+        generation = self._generation + 1
+        ingested = hashlib.sha256(self._ingested.encode('ascii') + added.tobytes()).hexdigest()[:16]
+        snapshot = Snapshot(f"{self._base_version}+{generation}.{ingested}",
+                            old.stats.extended(rows, year_index.frames()), year_index, summaries,
+                            old.cube.extended(rows), merge_cleaning_reports(old.cleaning, cleaning))
+        self._fingerprints = np.insert(self._fingerprints, np.searchsorted(self._fingerprints, added), added)
+        self._generation, self._ingested, self._snapshot = generation, ingested, snapshot
+        self._reject(rejected)
+        return int(new.sum())
+
+    def _reject(self, rejected):
+        if len(rejected):
+            self._rejected.append(rejected)
@@ -0,0 +1,64 @@
+"""
+Matplotlib/seaborn charts for the Data Overview page.
+
+Every chart is drawn on its own Figure through the object-oriented API (no pyplot global state), so figures can be
+rendered from any thread or process and turned into image bytes for caching. The app draws them in the worker
+processes of nuke_render.RenderPool; each function takes the chart's aggregated table and nothing else, so it can be
+sent to a worker.
+"""
+
+import io
+
+import numpy as np
+import seaborn as sns
+from matplotlib.figure import Figure
+
+
+# Pie slices smaller than this share of the total are exploded by these amounts in turn, from the smallest slice up
+SMALL_SLICE = 0.05
+SMALL_SLICE_EXPLODE = (.15, .3, .1)
+
+
+# Cold War influenced time series chart, one line per country
+def time_series_figure(df_time_series):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.lineplot(data=df_time_series, x='year', y='count', hue='country', ax=ax)  # ax allows you to display both USA and USSR
+    ax.set_xlabel('Year')
+    ax.set_ylabel('Number of Tests')
+    ax.legend(title='Country')
+    return fig
+
+
+def pie_chart_figure(countries_table):
+    fig = Figure(figsize=(10, 10))
+    ax = fig.subplots()
+    #  Explode the overlapping entries out from other entries: slices under SMALL_SLICE of the total are pushed out by
+    #  staggered amounts, starting with the smallest, so the labels of the tiniest neighbours don't overlap [Explode
+    #  idea from ChatGPT, see Docs]
+    counts = countries_table['Deployment Count'].to_numpy()
+    small = np.flatnonzero(counts / counts.sum() < SMALL_SLICE)
+    small = small[np.argsort(counts[small], kind='stable')]
+    explode = np.full(len(counts), .015)
+    explode[small] = np.resize(SMALL_SLICE_EXPLODE, len(small))
+    ax.pie(countries_table['Deployment Count'], labels=countries_table.index, autopct='%1.2f%%', startangle=90,
+           explode=explode, colors=sns.color_palette("pastel"))
+    ax.axis('equal')  # For scaling
+    return fig
+
+
+# Heatmap of the type occurrences in data
+def heatmap_figure(heat_pivot):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.heatmap(heat_pivot, cmap='RdPu', annot=True, fmt='d', linewidths=.5, ax=ax)
+    ax.set_title('Nuclear Explosions by Type of Deployment')
+    ax.set_xlabel('Type of Deployment')
+    ax.set_ylabel('Country')
+    return fig
+
+
+def figure_to_bytes(fig, fmt='png', dpi=100):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
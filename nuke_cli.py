@@ -0,0 +1,111 @@
+"""
+Command line access to the app's aggregations, without starting Streamlit.
+
+    python nuke_cli.py time-series --start 1960 --end 1970
+    python nuke_cli.py heatmap --format parquet --output heatmap.parquet
+    python nuke_cli.py all --format parquet --output results/
+    python nuke_cli.py cleaning
+
+JSON goes to stdout unless --output is given; Parquet needs --output (a directory for "all").
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+import nuke_analytics as analytics
+from nuke_data import DATA_PATH
+
+
+# Flat table for a result, with any index turned into columns
+def as_table(result):
+    if isinstance(result, pd.Series):
+        result = result.to_frame()
+    if not isinstance(result.index, pd.RangeIndex):
+        result = result.reset_index()
+    result.columns = [str(col) for col in result.columns]
+    return result
+
+
+def run_command(handle, args):
+    if args.command == 'time-series':
+        countries = args.countries or analytics.COLD_WAR_COUNTRIES
+        return {'time_series': analytics.time_series(handle, args.start, args.end, countries)}
+    if args.command == 'countries':
+        return {'country_counts': analytics.country_counts(handle)}
+    if args.command == 'heatmap':
+        return {'type_heatmap': analytics.type_heatmap(handle)}
+    if args.command == 'magnitudes':
+        countries = args.countries or list(handle.summaries)
+        results = {}
+        for country in countries:
+            for column, table in analytics.magnitude_summary(handle, country).items():
+                results[f'{column}_{country}'] = table
+        return results
+    if args.command == 'extremes':
+        countries = args.countries or list(handle.summaries)
+        results = {}
+        for country in countries:
+            top, bottom = analytics.yield_extremes(handle, country)
+            results[f'largest_{country}'], results[f'smallest_{country}'] = top, bottom
+        return results
+    if args.command == 'unique':
+        columns = args.columns or list(handle.columns)
+        return {f'unique_{column}': pd.Series(analytics.unique_values(handle, column)[1], name='count').rename_axis(column)
+                for column in columns}
+    if args.command == 'cleaning':
+        return {'cleaning': analytics.cleaning_report(handle)}
+    if args.command == 'all':
+        results = {}
+        for command in ('time-series', 'countries', 'heatmap', 'magnitudes', 'extremes'):
+            results.update(run_command(handle, argparse.Namespace(**dict(vars(args), command=command))))
+        return results
+    raise ValueError(f"Unknown command: {args.command!r}")
+
+
+def write_results(results, fmt, output):
+    tables = {name: as_table(result) for name, result in results.items()}
+    if fmt == 'json':
+        payload = {name: json.loads(table.to_json(orient='records', date_format='iso')) for name, table in tables.items()}
+        text = json.dumps(payload, indent=2)
+        if output:
+            Path(output).write_text(text)
+        else:
+            sys.stdout.write(text + '\n')
+        return
+    if not output:
+        raise SystemExit("--output is required for parquet")
+    output = Path(output)
+    if len(tables) == 1 and output.suffix == '.parquet':
+        next(iter(tables.values())).to_parquet(output, index=False)
+        return
+    output.mkdir(parents=True, exist_ok=True)
+    for name, table in tables.items():
+        table.to_parquet(output / f'{name}.parquet', index=False)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the nuclear explosions aggregations in batch.")
+    parser.add_argument('command', choices=['time-series', 'countries', 'heatmap', 'magnitudes', 'extremes', 'unique', 'cleaning', 'all'])
+    parser.add_argument('--data', default=DATA_PATH, help="explosions CSV (a fresh Parquet/Feather sidecar is used if present)")
+    parser.add_argument('--incoming', default=None, help="directory of extra files to ingest")
+    parser.add_argument('--start', type=int, default=None, help="first year for time-series")
+    parser.add_argument('--end', type=int, default=None, help="last year for time-series")
+    parser.add_argument('--countries', nargs='*', default=None, help="countries (default: USA USSR for time-series, all otherwise)")
+    parser.add_argument('--columns', nargs='*', default=None, help="columns for unique")
+    parser.add_argument('--format', choices=['json', 'parquet'], default='json')
+    parser.add_argument('--output', default=None)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handle = analytics.open_dataset(args.data, incoming_dir=args.incoming)
+    write_results(run_command(handle, args), args.format, args.output)
+
+
+if __name__ == '__main__':
+    main()
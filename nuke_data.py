@@ -0,0 +1,259 @@
+"""
+Loading and cleaning of the nuclear explosions dataset.
+
+Cleaning runs once, when rows enter the catalog, as the declared CLEANING_STEPS: whitespace normalization of the text
+columns, numeric coercion, flags for the zeros that stand in for missing magnitudes, and a real date column assembled
+from day/month/year. Every step is vectorized and reports how many values it touched, so render paths never have to
+clean again and what was changed can be inspected (python nuke_cli.py cleaning).
+
+Kept free of Streamlit so the same loader can be used by the app (which caches the result across sessions)
+and by any offline script. A dataset "version" is derived from the source file so callers can cache on it.
+
+The loaded frame is shared read-only by every session, so pandas' copy-on-write mode is switched on here: slices and
+column selections taken by the pages are views, and anything that writes to one gets its own copy instead of changing
+the shared data. A Feather sidecar is memory-mapped, so its numeric columns are backed by the OS page cache (shared
+with any other server process reading the same file) rather than by a private heap copy.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# The default from pandas 3 on, where the option no longer exists
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+
+DATA_PATH = Path(__file__).with_name('nuclear_explosions.csv')
+
+# Columnar copies of the CSV that are preferred when present and not older than the CSV itself
+SIDECAR_SUFFIXES = ('.parquet', '.feather')
+
+# Making column names easier to type + useable with certain functions
+RENAME_COLUMNS = {
+                    'WEAPON_SOURCE': 'country',
+                    'LOCATION': 'location',
+                    'Data.Source': 'data_source',
+                    'latitude': 'latitude',
+                    'longitude': 'longitude',
+                    'Data.Magnitude.Body': 'magnitude_body',
+                    'Data.Magnitude.Surface': 'magnitude_surface',
+                    'Location.Cordinates.Depth': 'depth',
+                    'Data.Yeild.Lower': 'yield_lower',
+                    'Data.Yeild.Upper': 'yield_upper',
+                    'Data.Purpose': 'purpose',
+                    'Data.Name': 'name',
+                    'Data.Type': 'type',
+                    'Date.Day': 'day',
+                    'Date.Month': 'month',
+                    'Date.Year': 'year'}
+
+
+# Declared dtypes of the cleaned table: categoricals for the low-cardinality strings and small integers for the date
+# parts. name (nearly unique), the coordinates and the measurements keep the types they were loaded with: float32 would
+# save 4 bytes a value but turns 5.8 into 5.800000190734863 in exports and statistics
+SCHEMA = {
+            'country': 'category',
+            'location': 'category',
+            'data_source': 'category',
+            'purpose': 'category',
+            'type': 'category',
+            'day': 'int8',
+            'month': 'int8',
+            'year': 'int16'}
+
+
+# Columns each cleaning step applies to
+TEXT_COLUMNS = ('country', 'location', 'data_source', 'purpose', 'name', 'type')
+NUMERIC_COLUMNS = ('latitude', 'longitude', 'magnitude_body', 'magnitude_surface', 'depth', 'yield_lower',
+                   'yield_upper', 'day', 'month', 'year')
+SENTINEL_ZERO_COLUMNS = ('magnitude_body', 'magnitude_surface')  # 0 means the magnitude wasn't measured
+DATE_PARTS = ('year', 'month', 'day')
+
+
+# Picks the file that will actually be read: a fresh columnar sidecar if there is one, otherwise the CSV
+def resolve_source(path=DATA_PATH):
+    path = Path(path)
+    csv_mtime = path.stat().st_mtime_ns if path.exists() else None
+    for suffix in SIDECAR_SUFFIXES:
+        sidecar = path.with_suffix(suffix)
+        if sidecar.exists() and (csv_mtime is None or sidecar.stat().st_mtime_ns >= csv_mtime):
+            return sidecar
+    return path
+
+
+# Cheap version string for cache keys; "hash" reads the whole file but survives touch/copy without content changes
+def dataset_version(path=DATA_PATH, method='mtime'):
+    source = resolve_source(path)
+    if method == 'hash':
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return f"{source.name}:{digest.hexdigest()[:16]}"
+    if method != 'mtime':
+        raise ValueError(f"Unknown version method: {method!r}")
+    stat = os.stat(source)
+    return f"{source.name}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def read_raw(source):
+    source = Path(source)
+    if source.suffix == '.parquet':
+        return pd.read_parquet(source)
+    if source.suffix == '.feather':
+        import pyarrow.feather as feather
+
+        # One block per column, so columns without nulls stay zero-copy views of the mapped file
+        return feather.read_table(source, memory_map=True).to_pandas(split_blocks=True)
+    return pd.read_csv(source)
+
+
+# Strips and collapses whitespace in text columns. Only the distinct values are cleaned, then mapped back to the rows
+def normalize_whitespace(df, columns=TEXT_COLUMNS):
+    changed, cleaned = {}, {}
+    for column in columns:
+        if column not in df.columns or not (pd.api.types.is_object_dtype(df[column])
+                                            or pd.api.types.is_string_dtype(df[column])):
+            continue
+        codes, uniques = pd.factorize(df[column])
+        original = pd.Series(uniques, dtype=object)
+        normalized = original.str.strip().str.replace(r'\s+', ' ', regex=True).fillna(original)  # non-strings kept
+        differs = (normalized != original).to_numpy(dtype=bool)
+        changed[column] = int(differs[codes[codes >= 0]].sum())
+        if changed[column]:
+            cleaned[column] = pd.Series(normalized.to_numpy()[codes], index=df.index).where(codes >= 0)
+    return df.assign(**cleaned), changed
+
+
+# Parses the numeric columns, values that aren't numbers become missing
+def coerce_numeric(df, columns=NUMERIC_COLUMNS):
+    changed, coerced = {}, {}
+    for column in columns:
+        if column not in df.columns or pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        changed[column] = int((values.isna() & df[column].notna()).sum())
+        coerced[column] = values
+    return df.assign(**coerced), changed
+
+
+# Adds a <column>_missing flag for each column whose zeros mark a missing measurement
+def flag_sentinel_zeros(df, columns=SENTINEL_ZERO_COLUMNS):
+    flags = {f'{column}_missing': (df[column] == 0).to_numpy() for column in columns if column in df.columns}
+    return df.assign(**flags), {column[:-len('_missing')]: int(flag.sum()) for column, flag in flags.items()}
+
+
+# Adds a datetime 'date' column from the year/month/day columns, impossible dates become NaT
+def assemble_date(df, parts=DATE_PARTS):
+    if not all(part in df.columns for part in parts):
+        return df, {}
+    date = pd.to_datetime(df[list(parts)].astype('float64'), errors='coerce')
+    return df.assign(date=date), {'date': int(date.isna().sum())}
+
+
+# (step, function) in the order they run, each returning the cleaned frame and {column: values changed or flagged}
+CLEANING_STEPS = (
+    ('normalize_whitespace', normalize_whitespace),
+    ('coerce_numeric', coerce_numeric),
+    ('flag_sentinel_zeros', flag_sentinel_zeros),
+    ('assemble_date', assemble_date))
+
+
+def run_cleaning(df, steps=CLEANING_STEPS):
+    records = []
+    for step, function in steps:
+        df, changed = function(df)
+        records += [(step, column, count) for column, count in changed.items()]
+    return df, pd.DataFrame(records, columns=['step', 'column', 'values'])
+
+
+# Report of two batches cleaned separately, as if they had been cleaned together
+def merge_cleaning_reports(*reports):
+    merged = pd.concat(reports, ignore_index=True)
+    return merged.groupby(['step', 'column'], sort=False, as_index=False)['values'].sum()
+
+
+# Casts the columns named in the schema; an integer column with missing values becomes float32 instead (exact for
+# integers this small). A column with values outside the range of its small integer type keeps the type it was loaded
+# with, as astype would wrap them around (a month of 1970 becoming -78)
+def apply_schema(df, schema=SCHEMA):
+    dtypes = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if pd.api.types.is_integer_dtype(dtype):
+            bounds = np.iinfo(dtype)
+            if df[column].min() < bounds.min or df[column].max() > bounds.max:
+                continue
+            if df[column].isna().any():
+                dtype = 'float32'
+        dtypes[column] = dtype
+    return df.astype(dtypes)
+
+
+# pd.concat that keeps categorical columns categorical, over the (sorted) union of every frame's categories. A plain
+# concat of categoricals whose categories differ falls back to object columns. Only the category lists are merged,
+# and each frame is recoded at most once.
+def concat_frames(frames):
+    frames = list(frames)
+    dtypes = {}
+    for column in frames[0].columns:
+        dtype = frames[0][column].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or all(frame[column].dtype == dtype for frame in frames[1:]):
+            continue
+        categories = dtype.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[column].cat.categories)
+        dtypes[column] = pd.CategoricalDtype(categories)
+    recoded = []
+    for frame in frames:
+        changed = {column: dtype for column, dtype in dtypes.items() if frame[column].dtype != dtype}
+        recoded.append(frame.astype(changed) if changed else frame)
+    return pd.concat(recoded)
+
+
+# Drops duplicate rows (unless the caller already has), applies the short column names, the cleaning steps and the
+# schema; returns the clean frame and the cleaning report
+def clean_with_report(raw, dedupe=True, schema=SCHEMA):
+    df = raw.drop_duplicates() if dedupe else raw
+    df, report = run_cleaning(df.rename(columns=RENAME_COLUMNS).reset_index(drop=True))
+    return (apply_schema(df, schema) if schema else df), report
+
+
+def clean_nukes(raw, dedupe=True, schema=SCHEMA):
+    return clean_with_report(raw, dedupe, schema)[0]
+
+
+def load_nukes(path=DATA_PATH, use_sidecar=True):
+    source = resolve_source(path) if use_sidecar else Path(path)
+    return clean_nukes(read_raw(source))
+
+
+# Writes a columnar copy of the raw CSV next to it, picked up by resolve_source on the next load
+def write_sidecar(path=DATA_PATH, fmt='parquet'):
+    path = Path(path)
+    raw = pd.read_csv(path)
+    sidecar = path.with_suffix(f'.{fmt}')
+    if fmt == 'parquet':
+        raw.to_parquet(sidecar, index=False)
+    elif fmt == 'feather':
+        raw.to_feather(sidecar, compression='uncompressed')  # compressed buffers can't be memory-mapped
+    else:
+        raise ValueError(f"Unknown sidecar format: {fmt!r}")
+    return sidecar
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a columnar sidecar for the explosions CSV.")
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--format', choices=['parquet', 'feather'], default='parquet')
+    args = parser.parse_args()
+    print(write_sidecar(args.path, args.format))
@@ -0,0 +1,141 @@
+"""
+Downsampling of user-built charts before they are sent to the browser.
+
+Each chart type gets a reduction that keeps what the chart shows:
+
+- line: Largest-Triangle-Three-Buckets (LTTB) over the points sorted by x, which keeps the peaks and troughs that
+  define the line's shape;
+- bar: the bars Vega-Lite would stack anyway, summed per x value; numeric x values with more distinct values than
+  max_points are grouped into equal-width bins, and text x values past the MAX_CATEGORY_BARS largest bars into one
+  "Other" bar;
+- scatter: a stratified random sample over a grid of cells, each non-empty cell keeping its share of the sample (and
+  at least one point), so dense areas stay dense and isolated points stay visible.
+
+The number of points sent is bounded by max_points (plus at most one point per grid cell for scatter plots) however
+many rows were selected. Sampling is seeded, so a chart doesn't change from one rerun to the next.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+MAX_CHART_POINTS = 2000
+SCATTER_GRID = 32  # cells per axis for stratified sampling
+MAX_CATEGORY_BARS = 50  # bars for a text x column, the largest ones plus "Other"
+
+
+class Downsampled(NamedTuple):
+    data: pd.DataFrame
+    x: str  # columns of data to plot
+    y: str
+    shown: int
+    total: int
+    method: str  # 'none', 'lttb', 'binned', 'stratified'
+
+
+# Column as floats for distance/area maths (datetimes as nanoseconds), None when it isn't numeric
+def _numeric(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype('int64').astype('float64')
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    return None
+
+
+# Positions of the points LTTB keeps out of (x, y) sorted by x; always keeps the first and last point
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold - 2 buckets between the first and last point; bucket i is edges[i]:edges[i + 1]
+    edges = np.append((np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1, n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end, next_end = edges[i], edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        # Twice the area of the triangle (previous pick, candidate, average of the next bucket)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(data, x, y, max_points=MAX_CHART_POINTS):
+    xs, ys = _numeric(data[x]), _numeric(data[y])
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    order = np.flatnonzero(valid)[np.argsort(xs[valid], kind='stable')]
+    keep = order[lttb_indices(xs[order], ys[order], max_points)]
+    return data.iloc[keep]
+
+
+# Bar heights per x value: the sum of y (what the stacked bars add up to), or the row count when y can't be summed
+# (text, dates, flags). Numeric x values are grouped into max_points equal-width bins, labelled by their midpoint, when
+# there are more distinct values than that; text x values beyond the max_categories - 1 largest bars are summed into
+# one "Other" bar. Returns the bars and the name of the height column.
+def binned_bars(data, x, y, max_points=MAX_CHART_POINTS, max_categories=MAX_CATEGORY_BARS):
+    values = data[y]
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        heights, height = values.to_numpy(), y if y != x else f'{y} (sum)'
+    else:
+        heights, height = np.ones(len(data), dtype=np.int64), 'count'
+    keys = data[x]
+    numeric_x = _numeric(keys) is not None
+    if numeric_x and keys.nunique() > max_points:
+        mids = pd.cut(keys, max_points).map(lambda interval: interval.mid)
+        keys = mids if pd.api.types.is_datetime64_any_dtype(keys) else mids.astype('float64')
+    bars = pd.Series(heights, index=data.index).groupby(keys.to_numpy(), sort=True).sum()
+    if not numeric_x and len(bars) > max_categories:
+        largest = bars.nlargest(max_categories - 1, keep='first').index
+        kept = bars.index.isin(largest)
+        other = pd.Series([bars[~kept].sum()], index=[f'Other ({int((~kept).sum())} values)'])
+        bars = pd.concat([bars[kept], other])
+    return bars.rename_axis(x).reset_index(name=height), height
+
+
+# Seeded sample of about max_points rows, stratified over a grid of (x, y) cells
+def stratified_sample(data, x, y, max_points=MAX_CHART_POINTS, grid=SCATTER_GRID, seed=0):
+    n = len(data)
+    if n <= max_points:
+        return data
+    cell = np.zeros(n, dtype=np.int64)
+    for column in dict.fromkeys([x, y]):
+        values = _numeric(data[column])
+        if values is None:
+            # Text values share grid stripes once there are more of them than that, so a column like name (nearly a
+            # value per row) can't turn every row into a cell of its own that keeps its one point
+            codes = pd.factorize(data[column], use_na_sentinel=False)[0] % grid
+        else:
+            finite = values[~np.isnan(values)]
+            lo, hi = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+            codes = np.clip(((values - lo) / ((hi - lo) or 1.0) * grid).astype(np.int64, copy=False), 0, grid - 1)
+            codes[np.isnan(values)] = grid  # missing values get their own stripe
+        cell = cell * (codes.max() + 1) + codes
+
+    # Random order, then each point's rank among the points of its cell; a cell keeps the points ranked below its quota
+    order = np.random.default_rng(seed).permutation(n)
+    by_cell = order[np.argsort(cell[order], kind='stable')]
+    sorted_cells = cell[by_cell]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    ranks = np.arange(n) - np.repeat(starts, counts)
+    quota = np.maximum(1, counts * max_points // n)
+    return data.iloc[np.sort(by_cell[ranks < np.repeat(quota, counts)])]
+
+
+# Chart data for a 'line', 'bar' or 'scatter' chart of y against x, reduced to about max_points points
+def downsample(data, kind, x, y, max_points=MAX_CHART_POINTS):
+    total = len(data)
+    if kind == 'bar':
+        bars, height = binned_bars(data, x, y, max_points)
+        return Downsampled(bars, x, height, len(bars), total, 'binned')
+    if total <= max_points:
+        return Downsampled(data, x, y, total, total, 'none')
+    if kind == 'line' and _numeric(data[x]) is not None and _numeric(data[y]) is not None:
+        reduced, method = lttb(data, x, y, max_points), 'lttb'
+    else:
+        reduced, method = stratified_sample(data, x, y, max_points), 'stratified'
+    return Downsampled(reduced, x, y, len(reduced), total, method)
@@ -0,0 +1,102 @@
+"""
+Table export to CSV, Parquet and Excel, written into in-memory buffers.
+
+Tables are written in chunks of rows so a large selection never needs a second full-size copy (a CSV string, a
+pyarrow table, a list of cells) next to the output buffer. Very large Excel exports switch xlsxwriter to its
+constant_memory mode, which flushes each finished row instead of keeping the whole sheet in memory.
+"""
+
+import io
+
+import pandas as pd
+
+
+CHUNK_ROWS = 50_000
+
+# Excel exports with at least this many rows use xlsxwriter's constant_memory mode
+CONSTANT_MEMORY_ROWS = 100_000
+
+# format -> (mime type, file suffix)
+EXPORT_FORMATS = {
+                'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', '.xlsx'),
+                'csv': ('text/csv', '.csv'),
+                'parquet': ('application/vnd.apache.parquet', '.parquet')}
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# Encoded CSV text, one chunk of rows at a time (the header only comes with the first chunk)
+def iter_csv_chunks(df, index=True, chunk_rows=CHUNK_ROWS):
+    if df.empty:
+        yield df.to_csv(index=index).encode('utf-8')
+        return
+    for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+        yield chunk.to_csv(index=index, header=(i == 0)).encode('utf-8')
+
+
+def write_csv(df, output, index=True, chunk_rows=CHUNK_ROWS):
+    for block in iter_csv_chunks(df, index, chunk_rows):
+        output.write(block)
+
+
+# One Parquet row group per chunk
+def write_parquet(df, output, index=True, chunk_rows=CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    chunks = iter_chunks(df, chunk_rows) if len(df) else [df]
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=index)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_xlsx(df, output, index=True, chunk_rows=CHUNK_ROWS, constant_memory=None):
+    if constant_memory is None:
+        constant_memory = len(df) >= CONSTANT_MEMORY_ROWS
+    if not constant_memory:
+        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=index)  # set index to true so the country shows in sheet
+        return
+
+    # pandas writes Excel cells column by column, but constant_memory only accepts rows in order, so the rows are
+    # written directly with xlsxwriter
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    try:
+        worksheet = workbook.add_worksheet()
+        bold = workbook.add_format({'bold': True})
+        header = ([df.index.name or ''] if index else []) + [str(col) for col in df.columns]
+        worksheet.write_row(0, 0, header, bold)
+        row_number = 1
+        for chunk in iter_chunks(df, chunk_rows):
+            if index:
+                chunk = chunk.reset_index()
+            cells = chunk.astype(object).where(chunk.notna(), None)  # Python scalars, missing values as blank cells
+            for row in cells.itertuples(index=False, name=None):
+                worksheet.write_row(row_number, 0, row)
+                row_number += 1
+    finally:
+        workbook.close()
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet, 'xlsx': write_xlsx}
+
+
+# Bytes of df in the given format, built in memory only when called (e.g. by a download button click)
+def export_table(df, fmt='xlsx', index=True, chunk_rows=CHUNK_ROWS, **kwargs):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    output = io.BytesIO()
+    WRITERS[fmt](df, output, index=index, chunk_rows=chunk_rows, **kwargs)
+    return output.getvalue()
@@ -0,0 +1,135 @@
+"""
+Sorted indexes over the explosions DataFrame.
+
+YearIndex keeps the row positions of the frame sorted by year (and separately by country then year), so a year range
+is two binary searches into a sorted array instead of a full boolean mask over every row on each slider move. Only
+the positions are sorted, never the rows: a caller gathers the rows (and just the columns) it needs at the positions of
+a range, and the frame itself, possibly memory-mapped, is never copied.
+
+Rows ingested later go into a small second index (the "delta", over a frame of just those rows) that is searched
+alongside the main one, and the two are merged once the delta grows past a fraction of the main index, so appending
+rows neither re-sorts nor copies everything.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from nuke_data import concat_frames
+
+
+# Merge the delta into the main index once it holds more than this fraction of its rows
+COMPACT_RATIO = 0.1
+
+
+class YearIndex:
+    def __init__(self, data, column='year', by='country'):
+        self.data = data
+        self.column = column
+        self.by = by
+        self._delta = None
+
+        # Stable sorts keep the original file order within a year
+        years = data[column].to_numpy()
+        self._by_year = np.argsort(years, kind='stable')
+        self._years = years[self._by_year]
+
+        # Positions sorted by (country, year), so each country is one contiguous block that is itself sorted by year.
+        # Rows without a country are left out of the blocks.
+        codes, keys = pd.factorize(data[by], sort=True)
+        by_group = self._by_year[np.argsort(codes[self._by_year], kind='stable')]
+        group_codes = codes[by_group]
+        by_group = by_group[group_codes >= 0]
+        group_codes = group_codes[group_codes >= 0]
+        self._by_group = by_group
+        self._group_years = years[by_group]
+        self._blocks = {}
+        if len(group_codes):
+            starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+            ends = np.r_[starts[1:], len(group_codes)]
+            for start, end in zip(starts, ends):
+                self._blocks[keys[group_codes[start]]] = (int(start), int(end))
+
+    def __len__(self):
+        return len(self._years) + (len(self._delta) if self._delta is not None else 0)
+
+    # Bytes held by the sorted position and year arrays (and the delta's), not by the frames they point into
+    def memory_usage(self):
+        usage = sum(array.nbytes for array in (self._by_year, self._years, self._by_group, self._group_years))
+        return usage + (self._delta.memory_usage() if self._delta is not None else 0)
+
+    def groups(self):
+        if self._delta is None:
+            return list(self._blocks)
+        return list(dict.fromkeys(list(self._blocks) + self._delta.groups()))
+
+    # New index that also covers `rows`, the rows that follow the indexed ones in the file. They go into the delta
+    # (which holds its own frame); once the delta is past compact_ratio of the main index, the main and delta frames
+    # are concatenated and indexed afresh. That copies every row, but only once per compact_ratio * len(self) rows
+    # added, so the frame isn't copied on every append.
+    def extended(self, rows, compact_ratio=COMPACT_RATIO):
+        if rows.empty:
+            return self
+        delta_rows = rows if self._delta is None else concat_frames([self._delta.data, rows])
+        if len(delta_rows) > compact_ratio * len(self._years):
+            return YearIndex(concat_frames([self.data, delta_rows]), column=self.column, by=self.by)
+        extended = copy.copy(self)
+        extended._delta = YearIndex(delta_rows, column=self.column, by=self.by)
+        return extended
+
+    @property
+    def columns(self):
+        return self.data.columns
+
+    # The frames holding the indexed rows, in file order: the main frame, then the delta's
+    def frames(self):
+        return [self.data] + (self._delta.frames() if self._delta is not None else [])
+
+    # Every indexed row in file order as one frame, which is a copy once rows were added
+    def frame(self):
+        frames = self.frames()
+        return frames[0] if len(frames) == 1 else concat_frames(frames)
+
+    # All rows of one group
+    def group(self, key, columns=None):
+        return self.between(-np.inf, np.inf, groups=key, columns=columns)
+
+    # (lo, hi) of start <= year <= end in the year-sorted positions
+    def positions(self, start, end):
+        lo = int(np.searchsorted(self._years, start, side='left'))
+        hi = int(np.searchsorted(self._years, end, side='right'))
+        return lo, max(lo, hi)
+
+    # (lo, hi) of one group's start <= year <= end in the (group, year)-sorted positions
+    def group_positions(self, key, start, end):
+        block = self._blocks.get(key)
+        if block is None:
+            return 0, 0
+        block_start, block_end = block
+        years = self._group_years[block_start:block_end]
+        lo = block_start + int(np.searchsorted(years, start, side='left'))
+        hi = block_start + int(np.searchsorted(years, end, side='right'))
+        return lo, max(lo, hi)
+
+    # Non-empty (frame, positions) pairs that together hold the rows between() would return, in the same order. The
+    # positions are slices of the sorted arrays (no copy), so a caller can gather just the columns it needs.
+    def ranges(self, start, end, groups=None):
+        if groups is None:
+            ranges = [(self.data, self._by_year[slice(*self.positions(start, end))])]
+        else:
+            groups = [groups] if isinstance(groups, str) else groups
+            ranges = [(self.data, self._by_group[slice(*self.group_positions(key, start, end))]) for key in groups]
+        if self._delta is not None:
+            ranges += self._delta.ranges(start, end, groups)
+        return [(frame, positions) for frame, positions in ranges if len(positions)]
+
+    # Rows with start <= year <= end, optionally limited to some countries and to some columns. Only the matching
+    # rows of those columns are gathered.
+    def between(self, start, end, groups=None, columns=None):
+        columns = list(self.data.columns) if columns is None else list(columns)
+        parts = [frame.iloc[positions, frame.columns.get_indexer(columns)]
+                 for frame, positions in self.ranges(start, end, groups)]
+        if not parts:
+            return self.data.iloc[0:0][columns]
+        return parts[0] if len(parts) == 1 else concat_frames(parts)
@@ -0,0 +1,94 @@
+"""
+Bulk marker layers for the folium maps.
+
+Popups are assembled as one string column with vectorized ops, and every explosion becomes a single row of a
+FastMarkerCluster data array ([lat, lon, popup, color]) that is turned into markers in the browser. This replaces
+one folium.Marker/Popup/Icon object (and its own block of generated JS) per row.
+
+Selections that are too big for individual markers are drawn from nuke_spatial.aggregate_cells instead, one circle
+per grid cell.
+
+Maps are shown as standalone HTML documents (map_html), which the app caches on disk instead of serializing the
+folium objects again on every rerun.
+"""
+
+import numpy as np
+import folium
+from folium.plugins import FastMarkerCluster
+
+
+# Columns that go into each marker's popup
+POPUP_COLUMNS = ['latitude', 'longitude', 'location', 'day', 'month', 'year', 'magnitude_body', 'magnitude_surface', 'purpose']
+
+# Markers stop clustering once zoomed in this far, so individual explosions are always reachable
+UNCLUSTER_ZOOM = 6
+
+# AwesomeMarkers color names that are not CSS colors, for the cell circles
+CSS_COLORS = {'darkpurple': '#5b396b', 'lightred': '#eb7d7f', 'beige': '#ffcb92'}
+
+# Same icon as folium.Icon(icon=..., color=..., prefix=...), built client-side from each data row
+MARKER_CALLBACK = """function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: %(icon)s, prefix: %(prefix)s, markerColor: row[3]});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2], {maxWidth: 700});
+    return marker;
+}"""
+
+
+# "Location: ...<br>Date: m/d/y<br>..." for every row at once
+def popup_html(data):
+    return ("Location: " + data['location'].astype(str)
+            + "<br>Date: " + data['month'].astype(str) + "/" + data['day'].astype(str) + "/" + data['year'].astype(str)
+            + "<br>Magnitude Body: " + data['magnitude_body'].astype(str)
+            + "<br>Magnitude Surface: " + data['magnitude_surface'].astype(str)
+            + "<br>Purpose: " + data['purpose'].astype(str))
+
+
+# Marker colors: looked up per purpose in color_map (gray when missing), or one color for the whole layer
+def marker_colors(data, color_map=None, color='gray'):
+    if color_map is None:
+        return [color] * len(data)
+    return data['purpose'].astype(object).map(color_map).fillna(color).tolist()
+
+
+def marker_layer(data, color_map=None, color='gray', icon='star', prefix='fa', name=None):
+    callback = MARKER_CALLBACK % {'icon': repr(icon), 'prefix': repr(prefix)}
+    rows = zip(data['latitude'].tolist(), data['longitude'].tolist(), popup_html(data).tolist(),
+               marker_colors(data, color_map, color))
+    return FastMarkerCluster([list(row) for row in rows], callback=callback, name=name,
+                             disableClusteringAtZoom=UNCLUSTER_ZOOM)
+
+
+# Folium map centered on the selection with a single clustered marker layer
+def build_marker_map(data, zoom_start=2, **layer_kwargs):
+    markers = data[POPUP_COLUMNS].drop_duplicates()
+    if markers.empty:
+        center = [0, 0]
+    else:
+        center = [markers['latitude'].mean(), markers['longitude'].mean()]
+    m = folium.Map(location=center, zoom_start=zoom_start, control_scale=True)
+    marker_layer(markers, **layer_kwargs).add_to(m)
+    return m
+
+
+# One circle per grid cell, sized by explosion count and colored by the cell's dominant purpose
+def build_cell_map(cells, zoom_start=2, color_map=None, color='gray', **_marker_kwargs):
+    if cells.empty:
+        center = [0, 0]
+    else:
+        center = [np.average(cells['latitude'], weights=cells['count']), np.average(cells['longitude'], weights=cells['count'])]
+    m = folium.Map(location=center, zoom_start=zoom_start, control_scale=True)
+    colors = marker_colors(cells, color_map, color)
+    radii = 5 + 3 * np.log2(cells['count'].to_numpy())
+    for (cell, row), cell_color, radius in zip(cells.iterrows(), colors, radii):
+        cell_color = CSS_COLORS.get(cell_color, cell_color)
+        tooltip = (f"{row['count']} explosions around {row['location']}"
+                   f"<br>Mostly: {row['purpose']}<br>Max Magnitude Body: {row['magnitude_body']}")
+        folium.CircleMarker(location=[row['latitude'], row['longitude']], radius=float(radius), tooltip=tooltip,
+                            color=cell_color, fill=True, fill_color=cell_color, fill_opacity=0.6).add_to(m)
+    return m
+
+
+# The whole map as one standalone HTML document, scripts and styles included
+def map_html(m):
+    return m.get_root().render()
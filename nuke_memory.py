@@ -0,0 +1,98 @@
+"""
+Memory accounting for the data every session shares and for what each session adds on top.
+
+The catalog snapshot (frame, year index, count cube, column statistics and per-country summaries) is built once per
+dataset version and shared read-only by all sessions, see nuke_data. snapshot_memory() reports what it costs once per
+server process; session_memory() reports one session's own state, which is what grows with the number of users.
+schema_report() compares every column before and after nuke_data.SCHEMA is applied.
+
+    python nuke_memory.py            # shared memory of the bundled catalog, per component
+    python nuke_memory.py --schema   # per-column dtypes and bytes with and without the schema
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from nuke_data import DATA_PATH, SCHEMA, apply_schema, clean_nukes, read_raw, resolve_source
+
+
+# Rough size of a value and everything it holds: pandas objects report their own usage (strings included), containers
+# are walked, anything else is sys.getsizeof
+def value_bytes(value, _seen=None):
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_bytes(k, seen) + value_bytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(value_bytes(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+
+# Bytes per component of a catalog snapshot, computed column statistics only (the rest are built on first use)
+def snapshot_memory(snapshot):
+    usage = {
+        'frame': sum(value_bytes(frame) for frame in snapshot.year_index.frames()),
+        'year_index': snapshot.year_index.memory_usage(),
+        'count_cube': value_bytes(snapshot.cube.cells),
+        'column_stats': value_bytes([snapshot.stats[column] for column in snapshot.stats.computed()]),
+        'summaries': value_bytes(snapshot.summaries)}
+    return pd.Series(usage, name='bytes').rename_axis('component')
+
+
+# Bytes per key of a session's state (st.session_state or any mapping), largest first
+def session_memory(state):
+    usage = {str(key): value_bytes(value) for key, value in state.items()}
+    return pd.Series(usage, name='bytes', dtype='int64').rename_axis('key').sort_values(ascending=False)
+
+
+# dtype and bytes of every column as loaded and with the schema applied, plus a total row
+def schema_report(raw, schema=SCHEMA):
+    before = clean_nukes(raw, schema=None)
+    after = apply_schema(before, schema)
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'bytes_after': after.memory_usage(index=False, deep=True)}).rename_axis('column')
+    report.loc['total'] = ['', '', report['bytes_before'].sum(), report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_after'] / report['bytes_before']
+    return report
+
+
+def format_bytes(n):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def main(argv=None):
+    import nuke_analytics as analytics
+
+    parser = argparse.ArgumentParser(description="Report the memory a catalog shares between sessions.")
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--schema', action='store_true', help="compare column memory with and without the schema")
+    args = parser.parse_args(argv)
+    if args.schema:
+        print(schema_report(read_raw(resolve_source(args.path))).round(3).to_string())
+        return
+    usage = snapshot_memory(analytics.open_dataset(args.path))
+    for component, n in usage.items():
+        print(f"{component:<14} {format_bytes(n):>12}")
+    print(f"{'total':<14} {format_bytes(usage.sum()):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Lazy, predicate-pushdown queries over a catalog snapshot.
+
+A Query only records predicates and a column projection; nothing is read until count(), to_frame() or iter_batches()
+is called. Predicates use the same (column, op, value) tuples as pyarrow's dataset filters:
+
+    Query(snapshot).where('country', 'in', ['USA', 'UK']).where('year', 'between', (1960, 1970))
+                   .where('yield_upper', '<=', 20).select(['name', 'year', 'yield_upper'])
+
+The snapshot's year index keeps the row positions sorted by (country, year), so every country is a contiguous block
+of positions, sorted by year. A country predicate and a year range are pushed down to that index and become one
+binary-searched range of positions per country, which is all that gets scanned. Any other predicate is evaluated on
+those positions, reading only its own column. Finally the projected columns are gathered at the matching positions.
+Only the result is copied, never the full frame.
+
+page() returns one window of the result, in file order or sorted server side by one column, for tables that only
+show a page of rows at a time: only the sort column is read for every match, the projected columns only for the
+window.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from nuke_data import concat_frames
+
+
+OPERATORS = {
+    '==': lambda values, value: values == value,
+    '!=': lambda values, value: values != value,
+    '<': lambda values, value: values < value,
+    '<=': lambda values, value: values <= value,
+    '>': lambda values, value: values > value,
+    '>=': lambda values, value: values >= value,
+    'in': lambda values, value: values.isin(list(value)),
+    'not in': lambda values, value: ~values.isin(list(value)),
+    'between': lambda values, value: values.between(*value),
+}
+
+BATCH_ROWS = 50_000
+
+
+class Page(NamedTuple):
+    rows: pd.DataFrame
+    total: int  # matching rows over all pages
+    offset: int
+
+
+class Query:
+    def __init__(self, handle, predicates=(), columns=None):
+        self.handle = handle
+        self.predicates = tuple(predicates)
+        self.columns = list(columns) if columns is not None else None
+
+    # New query that also requires `column op value`
+    def where(self, column, op, value):
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op!r}")
+        if column not in self.handle.columns:
+            raise KeyError(column)
+        return Query(self.handle, self.predicates + ((column, op, value),), self.columns)
+
+    # New query that only returns `columns` (in that order)
+    def select(self, columns):
+        missing = [column for column in columns if column not in self.handle.columns]
+        if missing:
+            raise KeyError(missing)
+        return Query(self.handle, self.predicates, columns)
+
+    # Country and year predicates answered by the index, and the rest that have to be checked row by row
+    def _plan(self):
+        index = self.handle.year_index
+        groups, start, end, residual = None, -np.inf, np.inf, []
+        for column, op, value in self.predicates:
+            if column == index.by and op in ('in', '==') and groups is None:
+                groups = list(value) if op == 'in' else [value]
+            elif column == index.column and op == 'between' and (start, end) == (-np.inf, np.inf):
+                start, end = value
+            else:
+                residual.append((column, op, value))
+        return index.ranges(start, end, groups), residual
+
+    # (frame, positions) for every scanned range with at least one matching row
+    def _matches(self):
+        ranges, residual = self._plan()
+        for frame, positions in ranges:
+            mask = None
+            for column, op, value in residual:
+                match = OPERATORS[op](frame[column].take(positions), value).to_numpy(dtype=bool, na_value=False)
+                mask = match if mask is None else mask & match
+            if mask is not None:
+                positions = positions[mask]
+            if len(positions):
+                yield frame, positions
+
+    def count(self):
+        return sum(len(positions) for _, positions in self._matches())
+
+    # Matching rows of the projected columns, in batches of at most batch_rows
+    def iter_batches(self, batch_rows=BATCH_ROWS):
+        columns = self._projection()
+        for frame, positions in self._matches():
+            column_positions = frame.columns.get_indexer(columns)
+            for first in range(0, len(positions), batch_rows):
+                yield frame.iloc[positions[first:first + batch_rows], column_positions]
+
+    # Same query with `index` added to the projection, if it isn't there already
+    def _with_column(self, column):
+        if column is None or self.columns is None or column in self.columns:
+            return self
+        return self.select([column] + self.columns)
+
+    def _projection(self):
+        return self.columns if self.columns is not None else list(self.handle.columns)
+
+    def _empty(self, index=None):
+        empty = self.handle.year_index.data.iloc[0:0][self._projection()]
+        return empty.set_index(index) if index is not None else empty
+
+    # All matching rows as one frame, optionally indexed by a column (fetched even if it isn't projected)
+    def to_frame(self, index=None):
+        query = self._with_column(index)
+        batches = list(query.iter_batches())
+        if not batches:
+            return query._empty(index)
+        result = concat_frames(batches)  # the main and delta frames of the index can have different categories
+        return result.set_index(index) if index is not None else result
+
+    # Rows offset..offset+limit of the result, sorted by sort_by if given (stable, missing values last) and in file order
+    # otherwise, as a Page
+    def page(self, offset, limit, sort_by=None, ascending=True, index=None):
+        query = self._with_column(index)
+        frames = {}  # id(frame) -> (number, frame), the main and delta frames of the index
+        frame_numbers, positions, keys = [], [], []
+        for frame, matched in self._matches():
+            number, _ = frames.setdefault(id(frame), (len(frames), frame))
+            frame_numbers.append(np.full(len(matched), number))
+            positions.append(matched)
+            if sort_by is not None:
+                keys.append(frame[sort_by].take(matched))
+        if not positions:
+            return Page(query._empty(index), 0, offset)
+        frame_numbers, positions = np.concatenate(frame_numbers), np.concatenate(positions)
+
+        # The ranges come in index order (by country, then year); the frames are numbered in file order, so this is
+        # the matches in file order, which a sort keeps for ties
+        file_order = np.lexsort((positions, frame_numbers))
+        if sort_by is None:
+            window = file_order[offset:offset + limit]
+        else:
+            keys = pd.concat(keys, ignore_index=True).take(file_order)
+            order = keys.sort_values(ascending=ascending, kind='stable', na_position='last')
+            window = order.index.to_numpy()[offset:offset + limit]
+        if not len(window):
+            return Page(query._empty(index), len(positions), offset)
+
+        # Gather the window from each frame it touches, then put the rows back in window order
+        columns = query._projection()
+        parts, part_order = [], []
+        for number, frame in frames.values():
+            in_frame = np.flatnonzero(frame_numbers[window] == number)
+            if len(in_frame):
+                parts.append(frame.iloc[positions[window[in_frame]], frame.columns.get_indexer(columns)])
+                part_order.append(in_frame)
+        rows = concat_frames(parts).iloc[np.argsort(np.concatenate(part_order), kind='stable')]
+        return Page(rows.set_index(index) if index is not None else rows, len(positions), offset)
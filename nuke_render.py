@@ -0,0 +1,101 @@
+"""
+Process pool that turns chart data into image bytes away from the Streamlit script threads.
+
+A session computes the (small) aggregated table for a chart and sends it, with the name of a nuke_charts figure
+function, to a worker process; the worker draws the figure and returns PNG bytes. Renders from different sessions run
+on separate cores instead of queuing behind the server's interpreter lock, and matplotlib state never lives in the
+server process at all. Workers are started with 'spawn' (forking a threaded server is unsafe) and import
+matplotlib/seaborn once, when they start.
+
+Every render waits at most `timeout` seconds and raises RenderTimeout past that. A render that overran may be stuck, so
+its workers are terminated and the next render starts a fresh pool; renders from other sessions that were queued or
+running on the terminated pool are resubmitted once to the new one. With workers=0 charts are drawn inline on the
+calling thread by the same functions.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+RENDER_TIMEOUT = 30.0  # seconds
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _warm_up():
+    import nuke_charts  # noqa: F401
+
+
+# Image bytes of nuke_charts.<figure_name>(data), run inside a worker (or inline)
+def render_chart(figure_name, data, fmt='png', dpi=100):
+    import nuke_charts as charts
+
+    return charts.figure_to_bytes(getattr(charts, figure_name)(data), fmt=fmt, dpi=dpi)
+
+
+class RenderPool:
+    def __init__(self, workers=None, timeout=RENDER_TIMEOUT):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()  # sessions run on separate threads and share one pool
+        self.renders = 0
+        self.timeouts = 0
+
+    # Worker processes are only started by the first render, so sessions that never draw a chart don't pay for them
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_warm_up)
+            return self._executor
+
+    # Drops `executor` if it is still the current one and kills its workers (a hung render never returns otherwise).
+    # Returns False when another render already replaced it.
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+        terminate_workers = getattr(executor, 'terminate_workers', None)  # Python 3.14+
+        if terminate_workers is not None:
+            terminate_workers()
+            return True
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def render(self, figure_name, data, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        self.renders += 1
+        if self.workers == 0:
+            return render_chart(figure_name, data)
+        for attempt in range(2):
+            executor = self._get_executor()
+            future = executor.submit(render_chart, figure_name, data)
+            try:
+                return future.result(timeout=timeout)
+            except (BrokenProcessPool, CancelledError):
+                # Another render timed out and its pool was terminated under this one; try once on the new pool
+                self._discard(executor)
+                if attempt:
+                    raise
+            except FutureTimeoutError:
+                self.timeouts += 1
+                self._discard(executor)
+                raise RenderTimeout(f"{figure_name} did not render within {timeout:g} s") from None
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {'workers': self.workers, 'renders': self.renders, 'timeouts': self.timeouts}
@@ -0,0 +1,202 @@
+"""
+Grid binning and spatial lookups of explosions over latitude/longitude.
+
+Used to keep map payloads bounded: a large selection is drawn as one marker per grid cell (count, dominant purpose,
+strongest body magnitude) and the user drills into a cell, then into finer cells, until few enough explosions remain
+to draw individually.
+
+PointIndex uses the same grid ids as a cell index for geographic questions: explosions within a radius of a point
+(haversine distance), the k nearest to a point, and explosions in a bounding box, each with count/yield/magnitude
+aggregates. It is built once per dataset version.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+# Cell sizes in degrees for each drill-down level, each one splitting the previous cell 10 x 10
+CELL_LEVELS = (5.0, 0.5, 0.05)
+
+
+# One integer id per row: row-major position of the cell in a cell_deg grid covering the globe
+def cell_ids(lat, lon, cell_deg):
+    n_cols = int(np.ceil(360 / cell_deg)) + 1
+    rows = np.floor((np.asarray(lat, dtype='float64') + 90) / cell_deg).astype('int64')
+    cols = np.floor((np.asarray(lon, dtype='float64') + 180) / cell_deg).astype('int64')
+    return rows * n_cols + cols
+
+
+# ((south, west), (north, east)) corners of a cell
+def cell_bounds(cell, cell_deg):
+    n_cols = int(np.ceil(360 / cell_deg)) + 1
+    row, col = divmod(int(cell), n_cols)
+    south, west = row * cell_deg - 90, col * cell_deg - 180
+    return (south, west), (south + cell_deg, west + cell_deg)
+
+
+def rows_in_cell(data, cell, cell_deg):
+    return data[cell_ids(data['latitude'], data['longitude'], cell_deg) == cell]
+
+
+# Most frequent value of a column within each cell (ties go to the value that sorts first)
+def _dominant(cells, values):
+    counts = pd.DataFrame({'cell': cells, 'value': values}).groupby(['cell', 'value'], observed=True).size()
+    counts = counts.reset_index(name='n').sort_values(['cell', 'n'], ascending=[True, False], kind='stable')
+    return counts.drop_duplicates('cell').set_index('cell')['value']
+
+
+# Per-cell count, mean position, dominant purpose/location and strongest body magnitude, biggest cells first
+def aggregate_cells(data, cell_deg):
+    cells = cell_ids(data['latitude'], data['longitude'], cell_deg)
+    grouped = data.groupby(cells)
+    aggregated = pd.DataFrame({
+        'count': grouped.size(),
+        'latitude': grouped['latitude'].mean(),
+        'longitude': grouped['longitude'].mean(),
+        'magnitude_body': grouped['magnitude_body'].max()})
+    aggregated['purpose'] = _dominant(cells, data['purpose'].to_numpy())
+    aggregated['location'] = _dominant(cells, data['location'].to_numpy())
+    aggregated.index.name = 'cell'
+    return aggregated.sort_values('count', ascending=False, kind='stable')
+
+
+EARTH_RADIUS_KM = 6371.0088
+HALF_CIRCUMFERENCE_KM = np.pi * EARTH_RADIUS_KM
+
+# Cell size of the point index, and the first radius tried by a nearest-neighbour search (grown 4x until k are found)
+INDEX_CELL_DEG = 1.0
+NEAREST_START_KM = 100.0
+
+
+# Great-circle distances in km between points given in degrees
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype='float64')) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Longitude intervals covering west..east, split in two when they cross the antimeridian
+def _lon_ranges(west, east):
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+class Hits(NamedTuple):
+    positions: np.ndarray  # row positions in the indexed frame
+    distance_km: np.ndarray  # from the query point, None for bounding boxes
+
+
+class AreaSummary(NamedTuple):
+    count: int
+    yield_upper_total: float
+    magnitude_min: float  # body magnitude, measured values only (NaN if none)
+    magnitude_max: float
+
+
+# Explosions sorted by grid cell, so the points in a latitude band of cells between two longitudes are one contiguous
+# block found by two binary searches. Radius, nearest-neighbour and bounding-box queries only compute distances for the
+# rows in the cells they overlap, never for the whole frame.
+class PointIndex:
+    def __init__(self, data, cell_deg=INDEX_CELL_DEG):
+        self.data = data
+        self.cell_deg = cell_deg
+        self._n_cols = int(np.ceil(360 / cell_deg)) + 1
+        lat = data['latitude'].to_numpy(dtype='float64', na_value=np.nan)
+        lon = data['longitude'].to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        cells = cell_ids(lat[valid], lon[valid], cell_deg)
+        order = np.argsort(cells, kind='stable')
+        self._positions = valid[order]
+        self._cells = cells[order]
+        self._lat, self._lon = lat[self._positions], lon[self._positions]
+
+        # Columns behind AreaSummary, by row position; magnitudes recorded as 0 were never measured
+        self._yield = data['yield_upper'].to_numpy(dtype='float64', na_value=np.nan)
+        magnitude = data['magnitude_body'].to_numpy(dtype='float64', na_value=np.nan)
+        missing = (data['magnitude_body_missing'].to_numpy(dtype=bool) if 'magnitude_body_missing' in data.columns
+                   else magnitude == 0)
+        self._magnitude = np.where(missing, np.nan, magnitude)
+
+    def __len__(self):
+        return len(self._positions)
+
+    # Index entries (positions into the sorted arrays) of every cell overlapping the box
+    def _candidates(self, south, north, lon_ranges):
+        rows = np.arange(np.floor((max(south, -90.0) + 90) / self.cell_deg),
+                         np.floor((min(north, 90.0) + 90) / self.cell_deg) + 1).astype('int64')
+        starts, ends = [], []
+        for west, east in lon_ranges:
+            first = rows * self._n_cols + int(np.floor((west + 180) / self.cell_deg))
+            last = rows * self._n_cols + int(np.floor((east + 180) / self.cell_deg))
+            starts.append(np.searchsorted(self._cells, first, side='left'))
+            ends.append(np.searchsorted(self._cells, last, side='right'))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        keep = ends > starts
+        if not keep.any():
+            return np.empty(0, dtype='int64')
+        return np.concatenate([np.arange(lo, hi) for lo, hi in zip(starts[keep], ends[keep])])
+
+    def _within(self, lat, lon, radius_km):
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = np.degrees(angle)
+        if abs(lat) + dlat >= 90 or angle >= np.pi / 2:  # the circle reaches a pole: every longitude
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            dlon = np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(lat))))
+            lon_ranges = _lon_ranges(lon - dlon, lon + dlon)
+        entries = self._candidates(lat - dlat, lat + dlat, lon_ranges)
+        distance = haversine_km(lat, lon, self._lat[entries], self._lon[entries])
+        inside = distance <= radius_km
+        return entries[inside], distance[inside]
+
+    # Explosions within radius_km of (lat, lon), closest first
+    def within_radius(self, lat, lon, radius_km):
+        entries, distance = self._within(lat, lon, radius_km)
+        order = np.argsort(distance, kind='stable')
+        return Hits(self._positions[entries[order]], distance[order])
+
+    # The k explosions closest to (lat, lon), closest first
+    def nearest(self, lat, lon, k):
+        k = min(int(k), len(self))
+        if k <= 0:
+            return Hits(np.empty(0, dtype='int64'), np.empty(0))
+        radius_km = NEAREST_START_KM
+        entries, distance = self._within(lat, lon, radius_km)
+        while len(entries) < k and radius_km < HALF_CIRCUMFERENCE_KM:
+            radius_km *= 4
+            entries, distance = self._within(lat, lon, radius_km)
+        if k < len(entries):
+            closest = np.argpartition(distance, k - 1)[:k]
+            entries, distance = entries[closest], distance[closest]
+        order = np.argsort(distance, kind='stable')
+        return Hits(self._positions[entries[order]], distance[order])
+
+    # Explosions with south <= latitude <= north and longitude from west to east (across the antimeridian when
+    # west > east), in file order
+    def in_bbox(self, south, west, north, east):
+        lon_ranges = [(-180.0, 180.0)] if (west, east) == (-180, 180) else _lon_ranges(west, east)
+        entries = self._candidates(south, north, lon_ranges)
+        lat, lon = self._lat[entries], self._lon[entries]
+        inside = (lat >= south) & (lat <= north)
+        inside &= np.logical_or.reduce([(lon >= lo) & (lon <= hi) for lo, hi in lon_ranges])
+        return Hits(np.sort(self._positions[entries[inside]]), None)
+
+    def summary(self, hits):
+        magnitudes = self._magnitude[hits.positions]
+        measured = magnitudes[~np.isnan(magnitudes)]
+        return AreaSummary(len(hits.positions), float(np.nansum(self._yield[hits.positions])),
+                           float(measured.min()) if len(measured) else np.nan,
+                           float(measured.max()) if len(measured) else np.nan)
+
+    # The matching rows, with a distance_km column first for radius and nearest-neighbour queries
+    def rows(self, hits):
+        rows = self.data.iloc[hits.positions]
+        if hits.distance_km is not None:
+            rows = rows.assign(distance_km=np.round(hits.distance_km, 1))[['distance_km'] + list(rows.columns)]
+        return rows
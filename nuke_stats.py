@@ -0,0 +1,238 @@
+"""
+Per-column statistics for the explosions DataFrame.
+
+The index is built once per dataset version and shared between sessions, so every column is only summarised the
+first time a page asks for it instead of on every rerun. Per-country summaries are likewise built for every country
+in one grouped pass, so switching countries is a dictionary lookup.
+"""
+
+import threading
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from nuke_data import concat_frames
+
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+# Statistics shown for each magnitude column on the country page
+MAGNITUDE_COLUMNS = ('magnitude_body', 'magnitude_surface')
+MAGNITUDE_AGGS = ['mean', 'median', 'min', 'max', 'std']
+
+
+class ColumnStats(NamedTuple):
+    unique: list  # distinct values in order of first appearance
+    counts: pd.Series  # frequency per value, sorted by value
+    nulls: int
+    min: object
+    max: object
+    quantiles: dict  # only filled for numeric columns
+
+
+# Goes through a field/column and finds all unique values for that field and counts its frequency, sorted by value
+# (categories that don't occur in the rows are left out, and categorical values are counted as plain values). Text
+# values are kept in a NumPy object index, which can be binary searched without converting it first.
+def find_unique_values(data, field):
+    unique_list = [val for val in data[field].unique()]
+    counts = data[field].value_counts()
+    counts = counts[counts > 0]
+    if isinstance(counts.index, pd.CategoricalIndex):
+        counts.index = counts.index.astype(counts.index.categories.dtype)
+    if pd.api.types.is_string_dtype(counts.index):
+        counts.index = counts.index.astype(object)
+    return unique_list, counts.sort_index()
+
+
+# Positions of `values` in the sorted `index` and whether each one is there, by binary search
+def _locate(index, values):
+    positions = index.searchsorted(values)
+    found = positions < len(index)
+    found[found] = np.asarray(index[positions[found]] == values[found], dtype=bool)
+    return positions, found
+
+
+# Frequencies of two batches of rows added up, both sorted by value: counts of values already known are added in
+# place and values seen for the first time are inserted at their sorted position, so nothing is hashed or re-sorted
+def merge_counts(old, new):
+    positions, found = _locate(old.index, new.index)
+    added = ~found
+    counts = new.to_numpy()
+    values = np.insert(old.to_numpy(), positions[added], counts[added])
+    index = np.insert(old.index.to_numpy(), positions[added], new.index.to_numpy()[added])
+    # Known values moved right by the number of values inserted before them
+    shifted = positions[found] + np.searchsorted(positions[added], positions[found], side='right')
+    values[shifted] += counts[found]
+    return pd.Series(values, index=pd.Index(index, dtype=old.index.dtype), name=old.name)
+
+
+# Linear-interpolated quantiles (same as Series.quantile) from a value -> frequency Series sorted by value, so they
+# can be kept up to date when rows are added without going back to the column
+def quantiles_from_counts(counts, quantiles=QUANTILES):
+    if not len(counts):
+        return {}
+    values = counts.index.to_numpy(dtype='float64')
+    cumulative = np.cumsum(counts.to_numpy())
+    result = {}
+    for q in quantiles:
+        h = (cumulative[-1] - 1) * q
+        lo = int(np.floor(h))
+        lo_value = values[np.searchsorted(cumulative, lo, side='right')]
+        hi_value = values[np.searchsorted(cumulative, min(lo + 1, cumulative[-1] - 1), side='right')]
+        result[q] = float(lo_value + (h - lo) * (hi_value - lo_value))
+    return result
+
+
+def compute_column_stats(data, field, quantiles=QUANTILES):
+    column = data[field]
+    unique_list, counts = find_unique_values(data, field)
+    col_min, col_max = (counts.index[0], counts.index[-1]) if len(counts) else (None, None)
+    quantile_values = quantiles_from_counts(counts, quantiles) if pd.api.types.is_numeric_dtype(column) else {}
+    return ColumnStats(unique_list, counts, int(column.isna().sum()), col_min, col_max, quantile_values)
+
+
+# Stats for a column after rows were added, from the old stats and the stats of just the new rows. Nothing is
+# recomputed over the old rows, and merging the counts costs a copy of them, not a sort.
+def merge_column_stats(old, new, numeric, quantiles=QUANTILES):
+    new_values = pd.Index([value for value in new.unique if not pd.isna(value)], dtype=old.counts.index.dtype)
+    unique_list = old.unique + list(new_values[~_locate(old.counts.index, new_values)[1]])
+    if new.nulls and not old.nulls:
+        unique_list.append(next(value for value in new.unique if pd.isna(value)))
+    counts = merge_counts(old.counts, new.counts)
+    col_min, col_max = (counts.index[0], counts.index[-1]) if len(counts) else (None, None)
+    quantile_values = quantiles_from_counts(counts, quantiles) if numeric else {}
+    return ColumnStats(unique_list, counts, old.nulls + new.nulls, col_min, col_max, quantile_values)
+
+
+# Lazy {column: ColumnStats} mapping, each column is computed on first access and then kept. The table can be given as
+# the frames it is stored in (see nuke_index.YearIndex.frames), which are summarised one by one and merged.
+class ColumnStatsIndex:
+    def __init__(self, data, quantiles=QUANTILES):
+        self._frames = [data] if isinstance(data, pd.DataFrame) else list(data)
+        self._columns = self._frames[0].columns
+        self._quantiles = quantiles
+        self._stats = {}
+        self._lock = threading.Lock()  # sessions run on separate threads and share one index
+
+    def _compute(self, field):
+        numeric = pd.api.types.is_numeric_dtype(self._frames[0][field])
+        stats = compute_column_stats(self._frames[0], field, self._quantiles)
+        for frame in self._frames[1:]:
+            stats = merge_column_stats(stats, compute_column_stats(frame, field, self._quantiles), numeric,
+                                       self._quantiles)
+        return stats
+
+    def __getitem__(self, field):
+        stats = self._stats.get(field)
+        if stats is None:
+            if field not in self._columns:
+                raise KeyError(field)
+            with self._lock:
+                stats = self._stats.get(field)
+                if stats is None:
+                    stats = self._compute(field)
+                    self._stats[field] = stats
+        return stats
+
+    def __contains__(self, field):
+        return field in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def computed(self):
+        return list(self._stats)
+
+    # New index over `data` (the old rows followed by `rows`, or the frames holding them). Columns that were already
+    # computed are updated from the new rows alone; the rest stay lazy.
+    def extended(self, rows, data):
+        extended = ColumnStatsIndex(data, self._quantiles)
+        with self._lock:
+            computed = dict(self._stats)
+        for field, old in computed.items():
+            numeric = pd.api.types.is_numeric_dtype(rows[field])
+            extended._stats[field] = merge_column_stats(old, compute_column_stats(rows, field, self._quantiles),
+                                                        numeric, self._quantiles)
+        return extended
+
+
+class CountrySummary(NamedTuple):
+    count: int
+    top: pd.DataFrame  # largest yields first
+    bottom: pd.DataFrame  # smallest yields, shown largest first like the tail of a descending sort
+    magnitudes: dict  # magnitude column -> one-row DataFrame of MAGNITUDE_AGGS
+    magnitude_counts: dict  # magnitude column -> frequency per measured value (sorted), `magnitudes` comes from it
+
+
+# Positions of the k largest (or smallest) values, in descending order, found by partial selection instead of a full
+# sort. Of tied values the earliest in file order are picked (and listed in file order); missing values never are.
+def top_k_positions(values, k, largest=True):
+    values = np.asarray(values, dtype='float64')
+    candidates = np.flatnonzero(~np.isnan(values))
+    if k <= 0:
+        return candidates[:0]
+    if k < len(candidates):
+        keys = -values[candidates] if largest else values[candidates]
+        kth = np.partition(keys, k - 1)[k - 1]
+        better = np.flatnonzero(keys < kth)
+        tied = np.flatnonzero(keys == kth)[:k - len(better)]
+        candidates = candidates[np.sort(np.concatenate([better, tied]))]
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+# Magnitude columns with the values flagged <column>_missing by nuke_data (unmeasured zeros) masked out
+def measured_magnitudes(data, magnitude_columns=MAGNITUDE_COLUMNS):
+    return pd.DataFrame({column: data[column].mask(data[f'{column}_missing']) if f'{column}_missing' in data.columns
+                         else data[column] for column in magnitude_columns})
+
+
+# One-row DataFrame of MAGNITUDE_AGGS (sample standard deviation, like pandas) from a value -> frequency Series
+# sorted by value
+def magnitude_aggregates(counts, group, by='country'):
+    values, weights = counts.index.to_numpy(dtype='float64'), counts.to_numpy(dtype='float64')
+    n = weights.sum()
+    aggregates = dict.fromkeys(MAGNITUDE_AGGS, np.nan)
+    if n:
+        mean = (values * weights).sum() / n
+        aggregates.update(mean=mean, median=quantiles_from_counts(counts, (0.5,))[0.5], min=values.min(),
+                          max=values.max())
+        if n > 1:
+            aggregates['std'] = np.sqrt((weights * (values - mean) ** 2).sum() / (n - 1))
+    return pd.DataFrame([aggregates], index=pd.Index([group], name=by), columns=MAGNITUDE_AGGS)
+
+
+# {group: CountrySummary} for every value of `by`, top/bottom k rows by yield plus statistics of the measured
+# magnitudes. Rows are expected in file order (ties are picked by it).
+def country_summaries(data, k=5, by='country', yield_column='yield_lower', magnitude_columns=MAGNITUDE_COLUMNS):
+    measured = measured_magnitudes(data, magnitude_columns)
+    yields = data[yield_column].to_numpy(dtype='float64')
+
+    summaries = {}
+    for group, positions in data.groupby(by, observed=True).indices.items():
+        group_yields = yields[positions]
+        top = positions[top_k_positions(group_yields, k, largest=True)]
+        bottom = positions[top_k_positions(group_yields, k, largest=False)]
+        counts = {column: pd.Series(measured[column].to_numpy()[positions]).value_counts().sort_index()
+                  for column in magnitude_columns}
+        magnitudes = {column: magnitude_aggregates(counts[column], group, by) for column in magnitude_columns}
+        summaries[group] = CountrySummary(len(positions), data.iloc[top], data.iloc[bottom], magnitudes, counts)
+    return summaries
+
+
+# Summary of one group over two batches of rows, from the summaries of each batch: the top (bottom) k of all the rows
+# are among the two batches' top (bottom) k. Both batches must be indexed by file position, as the catalog's rows
+# are, so ties are still picked in file order.
+def merge_country_summaries(old, new, k=5, by='country', yield_column='yield_lower'):
+    candidates = concat_frames([old.top, old.bottom, new.top, new.bottom])
+    candidates = candidates[~candidates.index.duplicated()].sort_index(kind='stable')
+    yields = candidates[yield_column]
+    extremes = [candidates.iloc[top_k_positions(yields, k, largest)] for largest in (True, False)]
+    counts = {column: merge_counts(old.magnitude_counts[column], new.magnitude_counts[column])
+              for column in old.magnitude_counts}
+    group = next(iter(old.magnitudes.values())).index[0]
+    magnitudes = {column: magnitude_aggregates(column_counts, group, by) for column, column_counts in counts.items()}
+    return CountrySummary(old.count + new.count, *extremes, magnitudes, counts)
@@ -0,0 +1,147 @@
+"""
+Synthetic explosion catalogs with the bundled CSV's schema, for load and scale testing.
+
+The model is fitted from the bundled data: every synthetic row starts from a template row drawn from the real catalog,
+so the joint country/purpose/type frequencies and the correlations between location, year, type, yields and magnitudes
+carry over. Each draw is then perturbed: coordinates jittered around the test site, years shifted within the
+country's active period, yields scaled by log-normal noise (lower <= upper kept), non-zero magnitudes nudged, and a
+random valid day in a month drawn from the real month distribution. Zero magnitudes and yields stay zero, since they
+mark missing measurements in the source.
+
+    python nuke_synth.py 2000000 synthetic.csv --seed 7
+    python nuke_synth.py 2000000 synthetic.parquet --chunk-rows 250000
+
+Output is generated and written chunk by chunk, and the same seed (and chunk size) always gives the same file.
+"""
+
+import argparse
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from nuke_data import DATA_PATH
+
+
+CHUNK_ROWS = 100_000
+
+# Perturbation sizes
+COORDINATE_JITTER = 0.05  # degrees
+YEAR_SHIFT_PROBABILITY = 0.3  # share of rows moved one year (within the country's first/last year)
+YIELD_SIGMA = 0.15  # log-normal sigma for yields
+MAGNITUDE_JITTER = 0.1
+
+
+class CatalogModel(NamedTuple):
+    templates: pd.DataFrame  # de-duplicated source rows, raw column names
+    year_bounds: pd.DataFrame  # first/last year per country
+    month_probabilities: pd.Series  # month -> share of explosions
+
+
+def fit_model(raw):
+    templates = raw.drop_duplicates().reset_index(drop=True)
+    year_bounds = templates.groupby('WEAPON_SOURCE')['Date.Year'].agg(['min', 'max'])
+    month_probabilities = templates['Date.Month'].value_counts(normalize=True).sort_index()
+    return CatalogModel(templates, year_bounds, month_probabilities)
+
+
+def load_model(path=DATA_PATH):
+    return fit_model(pd.read_csv(path))
+
+
+def _perturbed_yields(rng, lower, upper):
+    scale = rng.lognormal(0, YIELD_SIGMA, len(lower))
+    lower, upper = lower * scale, upper * scale * rng.lognormal(0, YIELD_SIGMA / 3, len(upper))
+    return np.round(lower, 3), np.round(np.maximum(lower, upper), 3)
+
+
+def generate_chunk(model, rows, rng, first_id=0):
+    chunk = model.templates.iloc[rng.integers(0, len(model.templates), rows)].reset_index(drop=True)
+
+    chunk['latitude'] = np.round(np.clip(chunk['latitude'] + rng.normal(0, COORDINATE_JITTER, rows), -90, 90), 4)
+    chunk['longitude'] = np.round(((chunk['longitude'] + rng.normal(0, COORDINATE_JITTER, rows) + 180) % 360) - 180, 4)
+
+    bounds = model.year_bounds.loc[chunk['WEAPON_SOURCE']]
+    shift = rng.choice([-1, 0, 1], rows, p=[YEAR_SHIFT_PROBABILITY / 2, 1 - YEAR_SHIFT_PROBABILITY, YEAR_SHIFT_PROBABILITY / 2])
+    chunk['Date.Year'] = np.clip(chunk['Date.Year'].to_numpy() + shift, bounds['min'].to_numpy(), bounds['max'].to_numpy())
+
+    months = rng.choice(model.month_probabilities.index.to_numpy(), rows, p=model.month_probabilities.to_numpy())
+    days_in_month = _days_in_month(chunk['Date.Year'].to_numpy(), months)
+    chunk['Date.Month'] = months
+    chunk['Date.Day'] = rng.integers(1, days_in_month + 1)
+
+    for column in ('Data.Magnitude.Body', 'Data.Magnitude.Surface'):
+        values = chunk[column].to_numpy(dtype='float64')
+        nudged = np.round(np.clip(values + rng.normal(0, MAGNITUDE_JITTER, rows), 0.1, None), 1)
+        chunk[column] = np.where(values > 0, nudged, values)
+    chunk['Data.Yeild.Lower'], chunk['Data.Yeild.Upper'] = _perturbed_yields(
+        rng, chunk['Data.Yeild.Lower'].to_numpy(dtype='float64'), chunk['Data.Yeild.Upper'].to_numpy(dtype='float64'))
+
+    # Unique names keep synthetic rows distinct so de-duplication doesn't shrink the catalog
+    chunk['Data.Name'] = chunk['Data.Name'].astype(str) + '-' + pd.Series(np.arange(first_id, first_id + rows)).astype(str)
+    return chunk
+
+
+# Vectorized days-in-month, leap years included
+def _days_in_month(years, months):
+    days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[months]
+    leap = ((years % 4 == 0) & (years % 100 != 0)) | (years % 400 == 0)
+    return days + ((months == 2) & leap)
+
+
+def generate_chunks(model, rows, seed=0, chunk_rows=CHUNK_ROWS):
+    rng = np.random.default_rng(seed)
+    for first in range(0, rows, chunk_rows):
+        yield generate_chunk(model, min(chunk_rows, rows - first), rng, first_id=first)
+
+
+def write_catalog(path, rows, seed=0, chunk_rows=CHUNK_ROWS, fmt=None, model=None):
+    path = Path(path)
+    fmt = fmt or path.suffix.lstrip('.') or 'csv'
+    model = model or load_model()
+    chunks = generate_chunks(model, rows, seed, chunk_rows)
+
+    if fmt == 'csv':
+        with open(path, 'w', newline='') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(i == 0))
+        return path
+
+    import pyarrow as pa
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        open_writer = lambda schema: pq.ParquetWriter(path, schema)  # noqa: E731
+    elif fmt == 'feather':
+        open_writer = lambda schema: pa.ipc.new_file(path, schema)  # noqa: E731
+    else:
+        raise ValueError(f"Unknown output format: {fmt!r}")
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = open_writer(table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic nuclear explosions catalog.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default=None,
+                        help="default: from the output suffix")
+    parser.add_argument('--source', default=DATA_PATH, help="catalog the model is fitted from")
+    args = parser.parse_args(argv)
+    print(write_catalog(args.output, args.rows, args.seed, args.chunk_rows, args.format, load_model(args.source)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Opt-in timing of the sections of a page rerun.
+
+A RerunTimer is created at the top of every rerun and the app wraps its expensive steps in timer.section(name). When
+the timer is disabled, section() hands back one shared no-op context manager, so instrumented code pays for a method
+call and nothing else. When enabled, each section records its wall time and the net number of memory blocks the
+interpreter allocated while it ran (sys.getallocatedblocks, cheap enough to read around every section); nested sections
+are named 'outer/inner'. finish() appends the rerun to a JSON-lines log, if one is configured, and the records feed
+the app's debug panel.
+
+Heavy modules are imported through import_module() by the first feature that needs them. The first import of each is
+timed as an 'import/<module>' section and kept in IMPORT_TIMES for the life of the process.
+
+    python nuke_timing.py timings.jsonl      # median / p95 / max per page and section
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import pandas as pd
+
+
+_NO_OP = nullcontext()
+_LOG_LOCK = threading.Lock()  # sessions run on separate threads and share the log file
+
+# Seconds spent on the first import of each module loaded through import_module, in the order they were needed
+IMPORT_TIMES = {}
+
+
+def import_module(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+class Section(NamedTuple):
+    name: str
+    seconds: float
+    blocks: int  # net allocated memory blocks
+
+
+class RerunTimer:
+    def __init__(self, enabled=False, log_path=None, page=None):
+        self.log_path = log_path
+        self.enabled = enabled or bool(log_path)
+        self.page = page
+        self.sections = []
+        self._stack = []
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def section(self, name):
+        if not self.enabled:
+            return _NO_OP
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        self._stack.append(name)
+        full_name = '/'.join(self._stack)
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = Section(full_name, time.perf_counter() - start, sys.getallocatedblocks() - blocks)
+            self._stack.pop()
+            if self._finished:
+                # Ran after the rerun ended, e.g. an export generated when its download button is clicked. The debug
+                # panel is already drawn, so the record only goes to the log, if there is one
+                if self.log_path:
+                    self._write([record], record.seconds)
+            else:
+                self.sections.append(record)
+
+    # Module by name, imported now (inside an 'import/<name>' section) if this is the first time it is needed
+    def import_module(self, name):
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        with self.section(f'import/{name}'):
+            return import_module(name)
+
+    # Ends the rerun, logging it if there is a log file; returns the total seconds since the timer was created
+    def finish(self):
+        total = time.perf_counter() - self._start
+        self._finished = True
+        if self.log_path:
+            self._write(self.sections, total)
+        return total
+
+    def records(self):
+        return [{'section': s.name, 'ms': round(s.seconds * 1000, 2), 'blocks': s.blocks} for s in self.sections]
+
+    def _write(self, sections, total):
+        line = json.dumps({'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                           'page': self.page, 'total_seconds': total,
+                           'sections': [s._asdict() for s in sections]})
+        with _LOG_LOCK, open(self.log_path, 'a') as f:
+            f.write(line + '\n')
+
+
+# One row per logged section, with the page and timestamp of its rerun
+def read_log(path):
+    reruns = pd.read_json(path, lines=True)
+    sections = reruns[['timestamp', 'page', 'sections']].explode('sections').dropna(subset=['sections'])
+    return pd.concat([sections.drop(columns='sections').reset_index(drop=True),
+                      pd.DataFrame(sections['sections'].tolist())], axis=1)
+
+
+def summarize(path):
+    sections = read_log(path)
+    summary = sections.groupby(['page', 'name'])['seconds'].describe(percentiles=[0.5, 0.95])
+    return (summary[['count', '50%', '95%', 'max']] * [1, 1000, 1000, 1000]).rename(
+        columns={'50%': 'median_ms', '95%': 'p95_ms', 'max': 'max_ms'}).sort_values('p95_ms', ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a rerun timing log.")
+    parser.add_argument('log')
+    args = parser.parse_args(argv)
+    print(summarize(args.log).round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
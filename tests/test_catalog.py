@@ -0,0 +1,54 @@
+import shutil
+
+import pandas as pd
+
+from nuke_catalog import Catalog
+from nuke_data import DATA_PATH, write_sidecar
+
+
+def test_lines_with_the_wrong_number_of_fields_are_rejected(tmp_path):
+    path = tmp_path / DATA_PATH.name
+    shutil.copy(DATA_PATH, path)
+    catalog = Catalog(path)
+    before = catalog.snapshot
+
+    with open(path, 'a') as f:
+        f.write('USA,NTS,DOE,37,-116,0,0,0,1,2,Wr,Foo,Shaft,1,3,1970,5\n')  # one field too many
+        f.write('USA,NTS,DOE,37,-116,0,0,0,1,2,Wr,Foo,Shaft,1,3\n')  # one field short
+    after = catalog.refresh()
+
+    rejected = catalog.rejected
+    assert len(rejected) == 2
+    assert (rejected['reason'] == 'malformed line').all()
+    assert after is before
+    assert 'NTS' not in after.summaries
+
+
+def test_rewritten_sidecar_is_reloaded(tmp_path):
+    path = tmp_path / DATA_PATH.name
+    shutil.copy(DATA_PATH, path)
+    sidecar = write_sidecar(path)
+    path.unlink()  # sidecar-only deploy
+    catalog = Catalog(path)
+    before = catalog.snapshot
+
+    pd.read_parquet(sidecar).head(100).to_parquet(sidecar, index=False)
+    after = catalog.refresh()
+
+    assert len(after) == 100
+    assert after.version != before.version
+
+
+def test_values_out_of_range_of_the_schema_are_rejected(tmp_path):
+    path = tmp_path / DATA_PATH.name
+    shutil.copy(DATA_PATH, path)
+    catalog = Catalog(path)
+    before = catalog.snapshot
+
+    with open(path, 'a') as f:
+        f.write('USA,NTS,DOE,37,-116,0,0,0,1,2,Wr,Foo,Shaft,1,1970,1970\n')  # month doesn't fit the int8 column
+    after = catalog.refresh()
+
+    assert catalog.rejected['reason'].tolist() == ['Date.Month is out of range']
+    assert after is before
+    assert after.frame['month'].dtype == 'int8'